@@ -1,4 +1,24 @@
-from .advisor import (Advisor, all_high_level_suggestions, all_low_level_suggestions, high_level_combination,
-                      HighLevelSuggestion, LowLevelSuggestion)
-from .landscape import Landscape, load_landscapes, generate_random_landscape, load_landscapes, Selection
+from .advisor import (Advisor, BatchAdvisor, BlockAdvisor, all_high_level_suggestions, all_low_level_suggestions,
+                      high_level_combination, HighLevelSuggestion, LowLevelSuggestion, high_level_suggestion_matrix,
+                      low_level_suggestion_matrices)
+from .encoding import (combination_codes, indexed_combinations, combination_features, encode_combination,
+                       decode_combination, high_level_code, hamming_distance, high_level_suggestion_indices,
+                       low_level_suggestion_indices)
+from .landscape import (Landscape, LandscapeBatch, BlockLandscape, load_landscapes, generate_random_landscape,
+                        generate_random_landscapes, generate_random_block_landscapes, random_landscape_coefficients,
+                        all_suggestion_values, sorted_suggestion_values, Selection)
+from .simulation import (mean_advisor_rewards_after_random_selections,
+                         mean_advisor_rewards_after_random_selections_paired, counterfactual_advisor_statistics,
+                         suggestion_order_counts_after_random_selections, suggestion_order_counts_shard,
+                         random_landscape_batches, suggestion_orders, advisor_reward_statistics_after_random_selections,
+                         advisor_reward_statistics_with_repeats)
+from .accumulators import SuggestionOrderCounts, TrialStatistics
+from .block_model import BlockModel, experiment_model, random_block_landscape_coefficients
+from .topology import (local_neighbours, global_neighbours, neighbour_edges, neighbour_indices, suggestion_group_masks,
+                       first_suggestion_groups, edge_group_memberships, suggestion_group_signature)
+from .landscape_analytics import (landscape_rewards, local_optima, nr_local_optima, greedy_ascent_steps,
+                                  greedy_ascent_optima, basin_sizes, suggestion_best_ranks)
+from .runner import run_shards
+from .trios import (TopTrios, suggestion_frequency_weights, global_local_differences, trio_scores,
+                    preselect_trios, pool_trio_indices, search_pool_trios, select_balanced_trios)
 from .plotting import set_matplotlib_latex, plot_colours, set_axes_length
@@ -0,0 +1,154 @@
+"""
+Defines mergeable accumulators of simulation results. An accumulator can be filled in chunks or in separate processes
+(see runner), and the partial accumulators are merged into one. Accumulators are saved as JSON dictionaries.
+- SuggestionOrderCounts: how often the advisor's suggestion is the k-th best suggestion after every number of trials
+- TrialStatistics: count, mean and variance (Welford) of a value in every trial, with an optional histogram for
+  quantiles
+"""
+
+import numpy as np
+
+
+class SuggestionOrderCounts:
+    # counts[k - 1, t] is the number of rounds in which the advisor's suggestion in trial t (i.e. after t selections)
+    # is the k-th best suggestion
+    def __init__(self, nr_trials, nr_orders=16):
+        self._counts = np.zeros((nr_orders, nr_trials), dtype=np.int64)
+        self._nr_rounds = 0
+
+    def get_nr_rounds(self):
+        return self._nr_rounds
+
+    def get_counts(self):
+        return self._counts
+
+    def add(self, orders):
+        # orders has shape (nr_rounds, nr_trials), with the order (1 for the best suggestion) in every trial
+        nr_orders, nr_trials = self._counts.shape
+        indices = (np.asarray(orders) - 1) * nr_trials + np.arange(nr_trials)
+        self._counts += np.bincount(indices.ravel(), minlength=nr_orders * nr_trials).reshape(self._counts.shape)
+        self._nr_rounds += len(orders)
+
+    def merge(self, other):
+        self._counts += other._counts
+        self._nr_rounds += other._nr_rounds
+
+    def frequencies(self):
+        # dictionary from the order k (1, ..., 16) to the frequency (in percentage) of the advisor's suggestion
+        # being the k-th best suggestion after 0, 1, ..., nr_trials - 1 selections
+        return {order: 100 * self._counts[order - 1] / self._nr_rounds for order in range(1, len(self._counts) + 1)}
+
+    def to_dict(self):
+        return {"nr_rounds": self._nr_rounds, "counts": self._counts.tolist()}
+
+    @staticmethod
+    def from_dict(counts_dict):
+        counts = np.array(counts_dict["counts"], dtype=np.int64)
+        suggestion_order_counts = SuggestionOrderCounts(counts.shape[1], counts.shape[0])
+        suggestion_order_counts._counts = counts
+        suggestion_order_counts._nr_rounds = counts_dict["nr_rounds"]
+        return suggestion_order_counts
+
+
+class TrialStatistics:
+    # per trial: the number of values, their mean and M2 (the sum of squared deviations from the mean)
+    # batches of values and other accumulators are combined with the parallel variant of Welford's algorithm
+    # if histogram_edges are given, the values are also counted in the bins between the edges (values outside the
+    # edges are counted in the first or last bin), from which quantiles are estimated
+    def __init__(self, nr_trials, histogram_edges=None):
+        self._counts = np.zeros(nr_trials, dtype=np.int64)
+        self._means = np.zeros(nr_trials)
+        self._m2s = np.zeros(nr_trials)
+        self._histogram_edges = None if histogram_edges is None else np.array(histogram_edges, dtype=float)
+        self._histograms = None if histogram_edges is None else np.zeros((nr_trials, len(histogram_edges) - 1),
+                                                                         dtype=np.int64)
+
+    def _merge_moments(self, trials, counts, means, m2s):
+        old_counts = self._counts[trials]
+        new_counts = old_counts + counts
+        deltas = means - self._means[trials]
+        fractions = np.divide(counts, new_counts, out=np.zeros(np.shape(new_counts)), where=new_counts > 0)
+        self._means[trials] = np.where(old_counts == 0, means, self._means[trials] + deltas * fractions)
+        self._m2s[trials] += m2s + deltas ** 2 * old_counts * fractions
+        self._counts[trials] = new_counts
+
+    def _bin_indices(self, values):
+        bin_indices = np.searchsorted(self._histogram_edges, values, side="right") - 1
+        return np.clip(bin_indices, 0, len(self._histogram_edges) - 2)
+
+    def add_trial(self, trial, values):
+        # adds the values of one trial
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        mean = np.mean(values)
+        self._merge_moments(trial, len(values), mean, np.sum((values - mean) ** 2))
+        if self._histograms is not None:
+            self._histograms[trial] += np.bincount(self._bin_indices(values), minlength=self._histograms.shape[1])
+
+    def add(self, values):
+        # values has shape (nr_rounds, nr_trials)
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        means = np.mean(values, axis=0)
+        self._merge_moments(slice(None), len(values), means, np.sum((values - means) ** 2, axis=0))
+        if self._histograms is not None:
+            nr_trials, nr_bins = self._histograms.shape
+            indices = np.arange(nr_trials) * nr_bins + self._bin_indices(values)
+            self._histograms += np.bincount(indices.ravel(), minlength=nr_trials * nr_bins).reshape(nr_trials, nr_bins)
+
+    def merge(self, other):
+        self._merge_moments(slice(None), other._counts, other._means, other._m2s)
+        if self._histograms is not None:
+            self._histograms += other._histograms
+
+    def get_counts(self):
+        return self._counts
+
+    def get_means(self):
+        return self._means
+
+    def variances(self, ddof=0):
+        # ddof=0 is the variance of the values (as np.var), ddof=1 the unbiased estimate
+        return self._m2s / np.maximum(self._counts - ddof, 1)
+
+    def stds(self, ddof=0):
+        return np.sqrt(self.variances(ddof))
+
+    def standard_errors(self):
+        # standard errors of the means
+        return np.sqrt(self.variances(1) / np.maximum(self._counts, 1))
+
+    def quantiles(self, quantiles):
+        # estimated quantiles of every trial, shape (len(quantiles), nr_trials), by linear interpolation within the
+        # histogram bins
+        cumulative_counts = np.cumsum(self._histograms, axis=1)
+        estimates = np.zeros((len(quantiles), len(self._counts)))
+        for i, quantile in enumerate(quantiles):
+            ranks = quantile * cumulative_counts[:, -1]
+            bin_indices = np.minimum(np.sum(cumulative_counts < ranks[:, np.newaxis], axis=1),
+                                     self._histograms.shape[1] - 1)
+            previous_counts = np.where(bin_indices > 0, cumulative_counts[np.arange(len(ranks)), bin_indices - 1], 0)
+            bin_counts = np.maximum(self._histograms[np.arange(len(ranks)), bin_indices], 1)
+            fractions = np.clip((ranks - previous_counts) / bin_counts, 0, 1)
+            lower_edges = self._histogram_edges[bin_indices]
+            estimates[i] = lower_edges + fractions * (self._histogram_edges[bin_indices + 1] - lower_edges)
+        return estimates
+
+    def to_dict(self):
+        statistics_dict = {"counts": self._counts.tolist(), "means": self._means.tolist(), "m2s": self._m2s.tolist()}
+        if self._histograms is not None:
+            statistics_dict["histogram_edges"] = self._histogram_edges.tolist()
+            statistics_dict["histograms"] = self._histograms.tolist()
+        return statistics_dict
+
+    @staticmethod
+    def from_dict(statistics_dict):
+        trial_statistics = TrialStatistics(len(statistics_dict["counts"]), statistics_dict.get("histogram_edges"))
+        trial_statistics._counts = np.array(statistics_dict["counts"], dtype=np.int64)
+        trial_statistics._means = np.array(statistics_dict["means"], dtype=float)
+        trial_statistics._m2s = np.array(statistics_dict["m2s"], dtype=float)
+        if "histograms" in statistics_dict:
+            trial_statistics._histograms = np.array(statistics_dict["histograms"], dtype=np.int64)
+        return trial_statistics
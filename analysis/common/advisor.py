@@ -2,19 +2,38 @@
 Defines suggestion and AI advisor components for the bandit experiment.
 - LowLevelSuggestion: wraps a local AI suggestion
 - HighLevelSuggestion: wraps a global AI suggestion
-- Advisor: learns feature weights, estimates rewards, and samples suggestions
+- Advisor: learns feature weights, estimates rewards, and samples suggestions (values derived from the
+  coefficients are cached until the next update)
+- BatchAdvisor: runs many advisors in lockstep on stacked arrays
+- BlockAdvisor: learns feature weights incrementally, and samples combinations and suggestions block-wise for a
+  model of any size (see block_model)
+
+The reward estimate of a combination is a sum of 4 independent block terms, so the softmax over the 256 combinations
+is the product of 4 softmaxes over the 4 settings of each block. By default, the advisors sample, maximise and
+compute suggestion probabilities block-wise; factorized=False enumerates all combinations instead (reference).
+The block-wise computations and the cache of values over all combinations are used when all_combinations is the
+shared indexed_combinations list, other sequences of combinations are enumerated on every call.
 
 Utilities:
 - Suggestion: abstract interface
 - high_level_combination: computes high-level features
 - stable_softmax
+- least_squares_coefficients: pinv least squares from running normal-equation state
+- block_reward_estimates: block terms of the reward estimate for every setting of every block, shape (..., 4, 4)
 - all_high_level_suggestions
 - all_low_level_suggestions
+- high_level_suggestion_matrix: suggestion vectors of all_high_level_suggestions(), shape (16, 12)
+- low_level_suggestion_matrices: suggestion vectors of all_low_level_suggestions(block_nr1, block_nr2),
+  shape (4, 4, 16, 12) (zero for block_nr1 == block_nr2)
 """
 
 import numpy as np
 from itertools import product
 from abc import ABC, abstractmethod
+from .encoding import (indexed_combinations, combination_features, encode_combination, decode_combination,
+                       high_level_suggestion_indices, low_level_suggestion_indices, high_level_suggestion_index,
+                       low_level_suggestion_index, block_settings_code)
+from .block_model import experiment_model, block_softmax, block_product_probabilities, sample_block_settings
 
 
 def high_level_combination(combination):
@@ -34,31 +53,73 @@ def stable_softmax(values):
     return softmax
 
 
+def least_squares_coefficients(gram_matrix, moment_vector, rcond=0.00001):
+    # same solution as pinv(a=input_variables, rcond=rcond) @ output_variables, computed from
+    # gram_matrix = input_variables^T input_variables and moment_vector = input_variables^T output_variables
+    # (the singular values of the inputs are the square roots of the gram matrix eigenvalues,
+    # so the pinv cutoff on the singular values becomes rcond ** 2 on the eigenvalues)
+    # works on a single system or on stacked systems
+    eigenvalues, eigenvectors = np.linalg.eigh(gram_matrix)
+    cutoff = rcond ** 2 * np.max(eigenvalues, axis=-1, keepdims=True)
+    is_kept = eigenvalues > cutoff
+    inverse_eigenvalues = np.divide(1.0, eigenvalues, out=np.zeros_like(eigenvalues), where=is_kept)
+    projected_moments = np.einsum("...ji,...j->...i", eigenvectors, moment_vector)
+    return np.einsum("...ij,...j->...i", eigenvectors, inverse_eigenvalues * projected_moments)
+
+
+def block_reward_estimates(coefficients):
+    # the block term of block k with setting (a, b) is
+    # coefficients[2k] a + coefficients[2k + 1] b + coefficients[8 + k] ab
+    # works on a single coefficient vector or on stacked coefficient vectors, shape (..., 12)
+    return experiment_model.block_values(coefficients)
+
+
+def _is_all_combinations(all_combinations):
+    # only the shared indexed_combinations list (e.g. landscape.get_combinations()) counts as all combinations in code
+    # order, any other sequence (also an equal copy) is enumerated, so that the check is free on every call
+    return all_combinations is indexed_combinations
+
+
 class Suggestion(ABC):
     @abstractmethod
     def is_matching_combination(self, combination):
         pass
 
+    @abstractmethod
+    def matching_combination_mask(self):
+        pass
+
     @abstractmethod
     def suggestion_values(self):
         # return low- and high-level values in two arrays (unspecified values are set to None)
         pass
 
+    def suggestion_vector(self):
+        # return low- and high-level values in one array of 12 values (unspecified values are set to 0),
+        # the value of the suggestion is the dot product with the landscape coefficients
+        low_level_values, high_level_values = self.suggestion_values()
+        return np.array([0 if value is None else value for value in list(low_level_values) + list(high_level_values)],
+                        dtype=float)
+
 
 class HighLevelSuggestion(Suggestion):
     def __init__(self, high_level_combination):
         self._high_level_combination = high_level_combination
+        self._index = high_level_suggestion_index(high_level_combination)
+
+    def get_index(self):
+        # index in all_high_level_suggestions()
+        return self._index
 
     def is_matching_combination(self, combination):
-        return tuple(high_level_combination(combination)) == tuple(self._high_level_combination)
+        return high_level_suggestion_indices[encode_combination(combination)] == self._index
+
+    def matching_combination_mask(self):
+        # boolean array indexed by code
+        return high_level_suggestion_indices == self._index
 
     def all_matching_combinations(self):
-        all_combinations = list(product([-1, 1], repeat=8))
-        matching_combinations = []
-        for combination in all_combinations:
-            if self.is_matching_combination(combination):
-                matching_combinations.append(combination)
-        return matching_combinations
+        return [indexed_combinations[i] for i in np.flatnonzero(self.matching_combination_mask())]
 
     def suggestion_values(self):
         return [None for _ in range(8)], self._high_level_combination
@@ -85,20 +146,21 @@ class LowLevelSuggestion(Suggestion):
         self._low_level_combination2 = low_level_combination2
         self._block_number1 = block_number1
         self._block_number2 = block_number2
+        self._index = low_level_suggestion_index(low_level_combination1, low_level_combination2)
+        self._matching_suggestion_indices = low_level_suggestion_indices[block_number1, block_number2]
+
+    def get_index(self):
+        # index in all_low_level_suggestions(block_number1, block_number2)
+        return self._index
 
     def is_matching_combination(self, combination):
-        block_combination1 = combination[2 * self._block_number1: 2 * (self._block_number1 + 1)]
-        block_combination2 = combination[2 * self._block_number2: 2 * (self._block_number2 + 1)]
-        return tuple(block_combination1) == tuple(self._low_level_combination1) and \
-            tuple(block_combination2) == tuple(self._low_level_combination2)
+        return self._matching_suggestion_indices[encode_combination(combination)] == self._index
+
+    def matching_combination_mask(self):
+        return self._matching_suggestion_indices == self._index
 
     def all_matching_combinations(self):
-        all_combinations = list(product([-1, 1], repeat=8))
-        matching_combinations = []
-        for combination in all_combinations:
-            if self.is_matching_combination(combination):
-                matching_combinations.append(combination)
-        return matching_combinations
+        return [indexed_combinations[i] for i in np.flatnonzero(self.matching_combination_mask())]
 
     def suggestion_values(self):
         high_level_combination = [None for _ in range(4)]
@@ -154,16 +216,39 @@ def all_low_level_suggestions(block_nr1, block_nr2):
     return low_level_suggestions
 
 
+high_level_suggestion_matrix = np.array([suggestion.suggestion_vector() for suggestion in all_high_level_suggestions()])
+
+low_level_suggestion_matrices = np.zeros((4, 4, 16, 12))
+for _block_nr1 in range(4):
+    for _block_nr2 in range(4):
+        if _block_nr1 != _block_nr2:
+            low_level_suggestion_matrices[_block_nr1, _block_nr2] = np.array(
+                [suggestion.suggestion_vector() for suggestion in all_low_level_suggestions(_block_nr1, _block_nr2)])
+
+
 class Advisor:
-    def __init__(self, block_nr1, block_nr2):
+    def __init__(self, block_nr1, block_nr2, incremental=False, factorized=True):
         self._low_level_block_nr1, self._low_level_block_nr2 = block_nr1, block_nr2
+        self._factorized = factorized
         self._selections = []
         self._coefficients = [0 for _ in range(12)]
+        # the version is increased on every update of the coefficients, and invalidates the cache
+        self._coefficients_version = 0
+        self._cache = {}
+        self._cache_version = 0
         self._mean_reward = 100
+        # in incremental mode, the least squares fit is updated from running normal-equation state
+        # instead of refitting the whole selection history (same coefficients as the pinv fit)
+        self._incremental = incremental
+        self._gram_matrix = np.zeros((12, 12))
+        self._moment_vector = np.zeros(12)
+        # orthonormal basis of the rows seen so far, its size is the rank of the selections matrix
+        self._row_basis = np.zeros((0, 12))
         self._high_level_suggestions = all_high_level_suggestions()
         self._low_level_suggestions = all_low_level_suggestions(block_nr1, block_nr2)
 
     def combination_reward_estimate(self, combination):
+        combination = decode_combination(combination)
         high_combination = high_level_combination(combination)
         value = 0.0
         for i in range(8):
@@ -172,93 +257,391 @@ class Advisor:
             value += self._coefficients[8 + i] * high_combination[i]
         return value
 
+    def _cached(self, name, compute):
+        # values derived from the coefficients are computed once per version of the coefficients
+        if self._cache_version != self._coefficients_version:
+            self._cache = {}
+            self._cache_version = self._coefficients_version
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    def _enumerated(self, name, all_combinations, compute):
+        # values over all_combinations are only cached for indexed_combinations (see _is_all_combinations)
+        if _is_all_combinations(all_combinations):
+            return self._cached(name, compute)
+        return compute()
+
+    def _is_factorizable(self, all_combinations):
+        # the block-wise computations return codes, so all_combinations must be indexed_combinations
+        return self._factorized and _is_all_combinations(all_combinations)
+
+    def _set_coefficients(self, coefficients):
+        self._coefficients = coefficients
+        self._coefficients_version += 1
+
+    def _reward_estimates(self, all_combinations):
+        return self._enumerated("reward_estimates", all_combinations, lambda: np.array(
+            [self.combination_reward_estimate(combination) for combination in all_combinations]))
+
+    def _best_combination_indices(self, all_combinations):
+        def compute():
+            reward_estimates = self._reward_estimates(all_combinations)
+            return np.flatnonzero(reward_estimates == np.max(reward_estimates))
+        return self._enumerated("best_combination_indices", all_combinations, compute)
+
+    def _best_block_settings(self):
+        # indices of the best settings of every block, the best combinations are all their products
+        # (settings within rounding error of the best block term are ties, e.g. after a single selection)
+        def compute():
+            block_estimates = block_reward_estimates(self._coefficients)
+            return [np.flatnonzero(block_estimates[block_nr] >= np.max(block_estimates[block_nr]) - 0.000000001)
+                    for block_nr in range(4)]
+        return self._cached("best_block_settings", compute)
+
     def best_combination(self, all_combinations):
-        reward_estimates = [self.combination_reward_estimate(combination) for combination in all_combinations]
-        best_combinations_indices = np.flatnonzero(reward_estimates == np.max(reward_estimates))
-        return all_combinations[np.random.choice(best_combinations_indices)]
+        if self._is_factorizable(all_combinations):
+            # a uniform choice per block is a uniform choice among the best combinations
+            best_setting_indices = [np.random.choice(indices) for indices in self._best_block_settings()]
+            return all_combinations[block_settings_code(best_setting_indices)]
+        return all_combinations[np.random.choice(self._best_combination_indices(all_combinations))]
+
+    def block_probabilities(self):
+        # softmax probabilities of the settings of every block, shape (4, 4)
+        return self._cached("block_probabilities", lambda: block_softmax(block_reward_estimates(self._coefficients)))
 
     def combination_probabilities(self, all_combinations):
-        combination_reward_estimates = [self.combination_reward_estimate(combination) for combination in all_combinations]
-        return stable_softmax(np.array(combination_reward_estimates))
+        if self._is_factorizable(all_combinations):
+            return self._cached("combination_probabilities",
+                                lambda: block_product_probabilities(self.block_probabilities()))
+        return self._enumerated("combination_probabilities", all_combinations,
+                                lambda: stable_softmax(self._reward_estimates(all_combinations)))
 
     def sample_combination(self, all_combinations):
+        if self._is_factorizable(all_combinations):
+            return all_combinations[block_settings_code(sample_block_settings(self.block_probabilities()))]
         combination_probabilities = self.combination_probabilities(all_combinations)
         combination_index = np.random.choice(len(all_combinations), p=combination_probabilities)
         return all_combinations[combination_index]
 
     def update_with_selection(self, selection):
+        if self._incremental:
+            self._update_with_selection_incremental(selection)
+            return
         self._selections.append(selection)
         # compute coefficients (8 low-level and 4 high-level) via least squares
         input_variables = []
         output_variables = []
         for selection in self._selections:
-            input_variable = tuple(selection.get_combination()) + tuple(
-                high_level_combination(selection.get_combination()))
-            input_variables.append(input_variable)
+            input_variables.append(combination_features[selection.get_code()])
             reward = selection.get_reward() - self._mean_reward
             output_variables.append(reward)
         input_variables = np.array(input_variables)
         output_variables = np.reshape(np.array(output_variables), (len(output_variables), 1))
-        self._coefficients = np.reshape(np.linalg.pinv(a=input_variables, rcond=0.00001) @ output_variables, 12)
+        self._set_coefficients(np.reshape(np.linalg.pinv(a=input_variables, rcond=0.00001) @ output_variables, 12))
+
+    def _update_with_selection_incremental(self, selection):
+        self._selections.append(selection)
+        input_variable = combination_features[selection.get_code()]
+        reward = selection.get_reward() - self._mean_reward
+        self._gram_matrix += np.outer(input_variable, input_variable)
+        self._moment_vector += reward * input_variable
+        self._set_coefficients(least_squares_coefficients(self._gram_matrix, self._moment_vector))
+        # the rank only grows if the new row is not spanned by the previous rows
+        residual = input_variable - self._row_basis.T @ (self._row_basis @ input_variable)
+        residual_norm = np.linalg.norm(residual)
+        if residual_norm > 0.00000001 * np.linalg.norm(input_variable):
+            self._row_basis = np.vstack((self._row_basis, residual / residual_norm))
 
     def selections_matrix_rank(self):
-        input_variables = []
-        for selection in self._selections:
-            input_variable = tuple(selection.get_combination()) + tuple(
-                high_level_combination(selection.get_combination()))
-            input_variables.append(input_variable)
-        input_variables = np.array(input_variables)
+        if self._incremental:
+            return len(self._row_basis)
+        input_variables = np.array([combination_features[selection.get_code()] for selection in self._selections])
         return np.linalg.matrix_rank(input_variables)
 
+    def _matching_suggestion_high_level(self, combination):
+        return self._high_level_suggestions[high_level_suggestion_indices[encode_combination(combination)]]
+
+    def _matching_suggestion_low_level(self, combination):
+        matching_suggestion_indices = low_level_suggestion_indices[self._low_level_block_nr1, self._low_level_block_nr2]
+        return self._low_level_suggestions[matching_suggestion_indices[encode_combination(combination)]]
+
     def sample_suggestion_high_level(self, all_combinations):
-        sampled_combination = self.sample_combination(all_combinations)
-        for suggestion in self._high_level_suggestions:
-            if suggestion.is_matching_combination(sampled_combination):
-                return suggestion
-        return None
+        return self._matching_suggestion_high_level(self.sample_combination(all_combinations))
 
     def sample_suggestion_low_level(self, all_combinations):
-        sampled_combination = self.sample_combination(all_combinations)
-        for suggestion in self._low_level_suggestions:
-            if suggestion.is_matching_combination(sampled_combination):
-                return suggestion
-        return None
+        return self._matching_suggestion_low_level(self.sample_combination(all_combinations))
+
+    def suggestion_probabilities_high_level(self, all_combinations):
+        # exact probability of sampling each of all_high_level_suggestions()
+        def compute():
+            combination_codes = [encode_combination(combination) for combination in all_combinations]
+            return np.bincount(high_level_suggestion_indices[combination_codes],
+                               weights=self.combination_probabilities(all_combinations), minlength=16)
+        return self._enumerated("suggestion_probabilities_high_level", all_combinations, compute)
+
+    def suggestion_probabilities_low_level(self, all_combinations):
+        # exact probability of sampling each of all_low_level_suggestions(block_nr1, block_nr2)
+        def compute():
+            combination_codes = [encode_combination(combination) for combination in all_combinations]
+            matching_suggestion_indices = low_level_suggestion_indices[self._low_level_block_nr1,
+                                                                       self._low_level_block_nr2]
+            return np.bincount(matching_suggestion_indices[combination_codes],
+                               weights=self.combination_probabilities(all_combinations), minlength=16)
+        return self._enumerated("suggestion_probabilities_low_level", all_combinations, compute)
+
+    def sample_suggestions_high_level(self, all_combinations, nr_suggestions):
+        # nr_suggestions independent draws of sample_suggestion_high_level at once
+        suggestion_indices = np.random.choice(16, size=nr_suggestions,
+                                              p=self.suggestion_probabilities_high_level(all_combinations))
+        return [self._high_level_suggestions[i] for i in suggestion_indices]
+
+    def sample_suggestions_low_level(self, all_combinations, nr_suggestions):
+        suggestion_indices = np.random.choice(16, size=nr_suggestions,
+                                              p=self.suggestion_probabilities_low_level(all_combinations))
+        return [self._low_level_suggestions[i] for i in suggestion_indices]
 
     def best_suggestion_high_level(self, all_combinations):
-        best_combination = self.best_combination(all_combinations)
-        for suggestion in self._high_level_suggestions:
-            if suggestion.is_matching_combination(best_combination):
-                return suggestion
-        return None
+        return self._matching_suggestion_high_level(self.best_combination(all_combinations))
 
     def best_suggestion_low_level(self, all_combinations):
-        best_combination = self.best_combination(all_combinations)
-        for suggestion in self._low_level_suggestions:
-            if suggestion.is_matching_combination(best_combination):
-                return suggestion
-        return None
+        return self._matching_suggestion_low_level(self.best_combination(all_combinations))
 
     def all_best_combinations(self, all_combinations):
-        reward_estimates = [self.combination_reward_estimate(combination) for combination in all_combinations]
-        best_combinations_indices = np.flatnonzero(reward_estimates == np.max(reward_estimates))
-        return [all_combinations[i] for i in best_combinations_indices]
+        if self._is_factorizable(all_combinations):
+            # the products of the sorted best settings are in code order
+            return [all_combinations[block_settings_code(best_setting_indices)]
+                    for best_setting_indices in product(*self._best_block_settings())]
+        return [all_combinations[i] for i in self._best_combination_indices(all_combinations)]
 
     def all_best_suggestions_high_level(self, all_combinations):
-        best_combinations = self.all_best_combinations(all_combinations)
-        best_suggestions = []
-        for suggestion in self._high_level_suggestions:
-            for combination in best_combinations:
-                if suggestion.is_matching_combination(combination):
-                    best_suggestions.append(suggestion)
-                    break
-        return best_suggestions
+        best_combination_codes = [encode_combination(combination)
+                                  for combination in self.all_best_combinations(all_combinations)]
+        best_suggestion_indices = np.unique(high_level_suggestion_indices[best_combination_codes])
+        return [self._high_level_suggestions[i] for i in best_suggestion_indices]
 
     def all_best_suggestions_low_level(self, all_combinations):
-        best_combinations = self.all_best_combinations(all_combinations)
-        best_suggestions = []
-        for suggestion in self._low_level_suggestions:
-            for combination in best_combinations:
-                if suggestion.is_matching_combination(combination):
-                    best_suggestions.append(suggestion)
-                    break
-        return best_suggestions
+        best_combination_codes = [encode_combination(combination)
+                                  for combination in self.all_best_combinations(all_combinations)]
+        matching_suggestion_indices = low_level_suggestion_indices[self._low_level_block_nr1, self._low_level_block_nr2]
+        best_suggestion_indices = np.unique(matching_suggestion_indices[best_combination_codes])
+        return [self._low_level_suggestions[i] for i in best_suggestion_indices]
+
+
+class BatchAdvisor:
+    # advisor i behaves like Advisor(block_nrs1[i], block_nrs2[i]), but all advisors are
+    # fitted, evaluated and sampled at once
+    def __init__(self, block_nrs1, block_nrs2, incremental=False, factorized=True):
+        self._low_level_block_nrs1 = np.array(block_nrs1, dtype=int)
+        self._low_level_block_nrs2 = np.array(block_nrs2, dtype=int)
+        self._nr_advisors = len(self._low_level_block_nrs1)
+        self._factorized = factorized
+        self._input_variables = np.zeros((self._nr_advisors, 0, 12))
+        self._output_variables = np.zeros((self._nr_advisors, 0, 1))
+        # see Advisor, incremental mode keeps only the normal-equation state of every advisor
+        self._incremental = incremental
+        self._gram_matrices = np.zeros((self._nr_advisors, 12, 12))
+        self._moment_vectors = np.zeros((self._nr_advisors, 12))
+        self._coefficients = np.zeros((self._nr_advisors, 12))
+        self._mean_reward = 100
+        self._all_combinations = indexed_combinations
+        self._high_level_suggestions = all_high_level_suggestions()
+        # the low-level suggestions depend on the block numbers, so they are grouped per block pair
+        self._low_level_suggestions = {}
+        for block_nrs in set(zip(self._low_level_block_nrs1.tolist(), self._low_level_block_nrs2.tolist())):
+            self._low_level_suggestions[block_nrs] = all_low_level_suggestions(*block_nrs)
+
+    def get_nr_advisors(self):
+        return self._nr_advisors
+
+    def get_coefficients(self):
+        return self._coefficients
+
+    def reward_estimates(self):
+        # reward estimates of all combinations for every advisor, shape (nr_advisors, 256)
+        return self._coefficients @ combination_features.T
+
+    def block_probabilities(self):
+        # softmax probabilities of the settings of every block for every advisor, shape (nr_advisors, 4, 4)
+        return block_softmax(block_reward_estimates(self._coefficients))
+
+    def combination_probabilities(self):
+        if self._factorized:
+            return block_product_probabilities(self.block_probabilities())
+        reward_estimates = self.reward_estimates()
+        numerator = np.exp(reward_estimates - np.max(reward_estimates, axis=1, keepdims=True))
+        return numerator / np.sum(numerator, axis=1, keepdims=True)
+
+    def sample_combination_indices(self):
+        if self._factorized:
+            return block_settings_code(sample_block_settings(self.block_probabilities()))
+        # inverse transform sampling, as done by np.random.choice for a single advisor
+        cumulative_probabilities = np.cumsum(self.combination_probabilities(), axis=1)
+        cumulative_probabilities /= cumulative_probabilities[:, -1:]
+        random_values = np.random.random(self._nr_advisors)
+        combination_indices = np.sum(cumulative_probabilities <= random_values[:, np.newaxis], axis=1)
+        return np.minimum(combination_indices, len(self._all_combinations) - 1)
+
+    def sample_combination_codes(self):
+        return self.sample_combination_indices().astype(np.uint8)
+
+    def best_combination_indices(self):
+        # a uniformly random best combination of every advisor (see Advisor.best_combination)
+        # the best candidate with the highest random key is a uniform choice among the best candidates
+        if self._factorized:
+            block_estimates = block_reward_estimates(self._coefficients)
+            is_best = block_estimates >= np.max(block_estimates, axis=2, keepdims=True) - 0.000000001
+            random_keys = np.where(is_best, np.random.random(is_best.shape), -1)
+            return block_settings_code(np.argmax(random_keys, axis=2))
+        reward_estimates = self.reward_estimates()
+        is_best = reward_estimates == np.max(reward_estimates, axis=1, keepdims=True)
+        return np.argmax(np.where(is_best, np.random.random(is_best.shape), -1), axis=1)
+
+    def sample_combinations(self):
+        return [self._all_combinations[i] for i in self.sample_combination_indices()]
+
+    def update_with_selections(self, selections):
+        # selection i is fed to advisor i
+        codes = np.array([selection.get_code() for selection in selections])
+        rewards = np.array([selection.get_reward() for selection in selections], dtype=float)
+        self.update_with_rewards(codes, rewards)
+
+    def update_with_rewards(self, combination_codes, rewards):
+        # advisor i selected the combination combination_codes[i] and received rewards[i]
+        input_variables = combination_features[combination_codes]
+        if self._incremental:
+            self._gram_matrices += input_variables[:, :, np.newaxis] * input_variables[:, np.newaxis, :]
+            self._moment_vectors += (rewards - self._mean_reward)[:, np.newaxis] * input_variables
+            self._coefficients = least_squares_coefficients(self._gram_matrices, self._moment_vectors)
+            return
+        self._input_variables = np.concatenate((self._input_variables, input_variables[:, np.newaxis, :]), axis=1)
+        output_variables = (rewards - self._mean_reward)[:, np.newaxis, np.newaxis]
+        self._output_variables = np.concatenate((self._output_variables, output_variables), axis=1)
+        # compute coefficients (8 low-level and 4 high-level) via least squares for all advisors at once
+        self._coefficients = (np.linalg.pinv(self._input_variables, rcond=0.00001) @ self._output_variables)[:, :, 0]
+
+    def _suggestion_probabilities(self, suggestion_indices):
+        # sums the combination probabilities of every advisor per suggestion index, shape (nr_advisors, 16)
+        combination_probabilities = self.combination_probabilities()
+        advisor_suggestion_indices = 16 * np.arange(self._nr_advisors)[:, np.newaxis] + suggestion_indices
+        suggestion_probabilities = np.bincount(advisor_suggestion_indices.ravel(),
+                                               weights=combination_probabilities.ravel(),
+                                               minlength=16 * self._nr_advisors)
+        return np.reshape(suggestion_probabilities, (self._nr_advisors, 16))
+
+    def suggestion_probabilities_high_level(self):
+        # exact probability of sampling each of all_high_level_suggestions(), shape (nr_advisors, 16)
+        if self._factorized:
+            # the high-level feature of a block is -1 for settings 1 and 2 and 1 for settings 0 and 3
+            block_probabilities = self.block_probabilities()
+            high_level_block_probabilities = np.stack((block_probabilities[:, :, 1] + block_probabilities[:, :, 2],
+                                                       block_probabilities[:, :, 0] + block_probabilities[:, :, 3]),
+                                                      axis=-1)
+            return block_product_probabilities(high_level_block_probabilities)
+        return self._suggestion_probabilities(high_level_suggestion_indices[np.newaxis, :])
+
+    def suggestion_probabilities_low_level(self):
+        # exact probability of sampling each of all_low_level_suggestions(block_nr1, block_nr2)
+        if self._factorized:
+            block_probabilities = self.block_probabilities()
+            advisor_indices = np.arange(self._nr_advisors)
+            suggestion_block_probabilities = np.stack((block_probabilities[advisor_indices, self._low_level_block_nrs1],
+                                                       block_probabilities[advisor_indices, self._low_level_block_nrs2]),
+                                                      axis=1)
+            return block_product_probabilities(suggestion_block_probabilities)
+        return self._suggestion_probabilities(
+            low_level_suggestion_indices[self._low_level_block_nrs1, self._low_level_block_nrs2])
+
+    def matching_suggestion_indices_high_level(self, combination_codes):
+        # index of the high-level suggestion matching combination_codes[i] for every advisor
+        return high_level_suggestion_indices[combination_codes]
+
+    def matching_suggestion_indices_low_level(self, combination_codes):
+        return low_level_suggestion_indices[self._low_level_block_nrs1, self._low_level_block_nrs2, combination_codes]
+
+    def sample_suggestion_indices_high_level(self):
+        return self.matching_suggestion_indices_high_level(self.sample_combination_indices())
+
+    def sample_suggestion_indices_low_level(self):
+        return self.matching_suggestion_indices_low_level(self.sample_combination_indices())
+
+    def sample_suggestions_high_level(self):
+        return [self._high_level_suggestions[i] for i in self.sample_suggestion_indices_high_level()]
+
+    def sample_suggestions_low_level(self):
+        suggestion_indices = self.sample_suggestion_indices_low_level()
+        return [self._low_level_suggestions[(int(self._low_level_block_nrs1[i]), int(self._low_level_block_nrs2[i]))][j]
+                for i, j in enumerate(suggestion_indices)]
+
+
+class BlockAdvisor:
+    # incremental least squares advisor (see Advisor) for a model of any size
+    def __init__(self, model, block_nr1, block_nr2):
+        self._model = model
+        self._low_level_block_nr1, self._low_level_block_nr2 = block_nr1, block_nr2
+        nr_coefficients = model.get_nr_coefficients()
+        self._coefficients = np.zeros(nr_coefficients)
+        self._mean_reward = 100
+        self._gram_matrix = np.zeros((nr_coefficients, nr_coefficients))
+        self._moment_vector = np.zeros(nr_coefficients)
+        self._nr_selections = 0
+
+    def get_coefficients(self):
+        return self._coefficients
+
+    def get_nr_selections(self):
+        return self._nr_selections
+
+    def update_with_selection(self, setting_indices, reward):
+        input_variable = self._model.combination_features(setting_indices)
+        self._gram_matrix += np.outer(input_variable, input_variable)
+        self._moment_vector += (reward - self._mean_reward) * input_variable
+        self._coefficients = least_squares_coefficients(self._gram_matrix, self._moment_vector)
+        self._nr_selections += 1
+
+    def block_reward_estimates(self):
+        return self._model.block_values(self._coefficients)
+
+    def combination_reward_estimate(self, setting_indices):
+        block_nrs = np.arange(self._model.get_nr_blocks())
+        return np.sum(self.block_reward_estimates()[block_nrs, setting_indices], axis=-1)
+
+    def block_probabilities(self):
+        # softmax probabilities of the settings of every block, shape (nr_blocks, nr_settings)
+        return block_softmax(self.block_reward_estimates())
+
+    def sample_combination(self):
+        # setting index of every block
+        return sample_block_settings(self.block_probabilities())
+
+    def best_combination(self):
+        # a uniform choice among the best settings of every block (see Advisor)
+        block_estimates = self.block_reward_estimates()
+        best_setting_indices = []
+        for block_nr in range(self._model.get_nr_blocks()):
+            is_best = block_estimates[block_nr] >= np.max(block_estimates[block_nr]) - 0.000000001
+            best_setting_indices.append(np.random.choice(np.flatnonzero(is_best)))
+        return np.array(best_setting_indices)
+
+    def sample_suggestion_high_level(self):
+        return self._model.high_level_combination(self.sample_combination())
+
+    def sample_suggestion_low_level(self):
+        # setting indices of block_nr1 and block_nr2
+        setting_indices = self.sample_combination()
+        return setting_indices[self._low_level_block_nr1], setting_indices[self._low_level_block_nr2]
+
+    def suggestion_probabilities_high_level(self):
+        # probability of the high-level feature of every block being -1 and 1, shape (nr_blocks, 2)
+        # (a high-level suggestion has the product of the probabilities of its block features)
+        block_probabilities = self.block_probabilities()
+        is_positive = self._model.high_level_combination(np.arange(self._model.get_nr_settings())) > 0
+        return np.column_stack((np.sum(block_probabilities[:, ~is_positive], axis=1),
+                                np.sum(block_probabilities[:, is_positive], axis=1)))
+
+    def suggestion_probabilities_low_level(self):
+        # probability of every pair of settings of block_nr1 and block_nr2, shape (nr_settings, nr_settings)
+        block_probabilities = self.block_probabilities()
+        suggestion_block_probabilities = block_probabilities[[self._low_level_block_nr1, self._low_level_block_nr2]]
+        suggestion_probabilities = block_product_probabilities(suggestion_block_probabilities)
+        return np.reshape(suggestion_probabilities, (self._model.get_nr_settings(), -1))
@@ -0,0 +1,175 @@
+"""
+Defines a parametric version of the bandit model with nr_blocks blocks of block_size features each.
+A combination is given by the setting index of every block (an index in product([-1, 1], repeat=block_size)),
+and all rewards, suggestions and probabilities are computed per block, so the cost grows with
+nr_blocks * 2 ** block_size instead of with the 2 ** nr_features combinations.
+- BlockModel: block settings and features of a model size
+- experiment_model: BlockModel(4, 2), the model of the experiment (the 8-feature functions of advisor and landscape
+  are computed with it)
+The landscape and advisor of a model of any size are BlockLandscape (see landscape) and BlockAdvisor (see advisor).
+
+Utilities:
+- block_softmax: softmax over the settings of every block
+- block_product_probabilities: joint probabilities of independent blocks
+- sample_indices: samples indices from every row of a probability array
+- sample_block_settings: samples one setting index per block
+- block_landscape_coefficient_matrix: the equal variance equations of a model size
+- random_block_landscape_coefficients: draws the coefficients of many random landscapes at once
+"""
+
+import numpy as np
+from itertools import product, combinations
+
+
+class BlockModel:
+    def __init__(self, nr_blocks, block_size):
+        self._nr_blocks = nr_blocks
+        self._block_size = block_size
+        self._nr_features = nr_blocks * block_size
+        # feature values of every setting of a block, shape (nr_settings, block_size)
+        self._block_settings = np.array(list(product([-1, 1], repeat=block_size)))
+        self._nr_settings = len(self._block_settings)
+        # the low-level features and the high-level feature of every block setting
+        self._block_setting_features = np.column_stack(
+            (self._block_settings, np.prod(self._block_settings, axis=1))).astype(float)
+        self._squared_coefficients_solver = None
+
+    def get_nr_blocks(self):
+        return self._nr_blocks
+
+    def get_block_size(self):
+        return self._block_size
+
+    def get_nr_features(self):
+        return self._nr_features
+
+    def get_nr_coefficients(self):
+        # nr_features low-level and nr_blocks high-level coefficients
+        return self._nr_features + self._nr_blocks
+
+    def get_nr_settings(self):
+        return self._nr_settings
+
+    def get_block_settings(self):
+        return self._block_settings
+
+    def get_squared_coefficients_solver(self):
+        # the least squares solution of the coefficient matrix system is linear in the dependent values, and only
+        # the last nr_features dependent values (the squared low-level coefficients) are non-zero
+        if self._squared_coefficients_solver is None:
+            nr_pairs = self._nr_blocks * (self._nr_blocks - 1) // 2
+            self._squared_coefficients_solver = np.linalg.pinv(block_landscape_coefficient_matrix(self))[:, nr_pairs:]
+        return self._squared_coefficients_solver
+
+    def block_values(self, coefficients):
+        # value of every setting of every block, shape (..., nr_blocks, nr_settings)
+        # the value of a combination is the sum of the values of its block settings
+        coefficients = np.asarray(coefficients, dtype=float)
+        low_level_coefficients = np.reshape(coefficients[..., :self._nr_features],
+                                            coefficients.shape[:-1] + (self._nr_blocks, self._block_size))
+        high_level_coefficients = coefficients[..., self._nr_features:, np.newaxis]
+        block_coefficients = np.concatenate((low_level_coefficients, high_level_coefficients), axis=-1)
+        return block_coefficients @ self._block_setting_features.T
+
+    def combination_features(self, setting_indices):
+        # low- and high-level features of combinations given by their setting indices, shape (..., nr_blocks)
+        setting_features = self._block_setting_features[setting_indices]
+        low_level_features = np.reshape(setting_features[..., :-1], setting_features.shape[:-2] + (-1,))
+        return np.concatenate((low_level_features, setting_features[..., -1]), axis=-1)
+
+    def combination(self, setting_indices):
+        return tuple(self._block_settings[setting_indices].ravel().tolist())
+
+    def high_level_combination(self, setting_indices):
+        return self._block_setting_features[setting_indices, -1]
+
+    def random_setting_indices(self, size=None):
+        # setting indices of random combinations, shape size + (nr_blocks,)
+        size = () if size is None else tuple(np.atleast_1d(size))
+        return np.random.randint(0, self._nr_settings, size=size + (self._nr_blocks,))
+
+
+experiment_model = BlockModel(4, 2)
+
+
+def block_softmax(block_values):
+    numerator = np.exp(block_values - np.max(block_values, axis=-1, keepdims=True))
+    return numerator / np.sum(numerator, axis=-1, keepdims=True)
+
+
+def block_product_probabilities(block_probabilities):
+    # joint probabilities of independent blocks, shape (..., nr_blocks, nr_settings) -> (..., nr_settings ** nr_blocks)
+    # in product order (the setting of the first block varies slowest), e.g. the combination probabilities by code
+    joint_probabilities = block_probabilities[..., 0, :]
+    for block_nr in range(1, block_probabilities.shape[-2]):
+        block_nr_probabilities = block_probabilities[..., block_nr, np.newaxis, :]
+        joint_probabilities = joint_probabilities[..., :, np.newaxis] * block_nr_probabilities
+        joint_probabilities = np.reshape(joint_probabilities, joint_probabilities.shape[:-2] + (-1,))
+    return joint_probabilities
+
+
+def sample_indices(probabilities, nr_draws):
+    # inverse transform sampling of nr_draws indices from every row of probabilities,
+    # shape (..., nr_indices) -> (..., nr_draws)
+    cumulative_probabilities = np.cumsum(probabilities, axis=-1)
+    cumulative_probabilities /= cumulative_probabilities[..., -1:]
+    random_values = np.random.random(probabilities.shape[:-1] + (nr_draws,))
+    indices = np.sum(cumulative_probabilities[..., np.newaxis, :] <= random_values[..., np.newaxis], axis=-1)
+    return np.minimum(indices, probabilities.shape[-1] - 1)
+
+
+def sample_block_settings(block_probabilities):
+    # one setting index per block, shape (..., nr_blocks, nr_settings) -> (..., nr_blocks)
+    return sample_indices(block_probabilities, 1)[..., 0]
+
+
+def block_landscape_coefficient_matrix(model):
+    # the equations that ensure equal variance for low- and high-level advice: for every pair of blocks the squared
+    # low-level coefficients outside the pair sum to the squared high-level coefficients of the pair
+    nr_blocks, block_size = model.get_nr_blocks(), model.get_block_size()
+    coefficient_matrix = []
+    for block_pair in combinations(range(nr_blocks), 2):
+        matrix_line = []
+        for j in range(nr_blocks):
+            matrix_line.extend([0 if j in block_pair else 1] * block_size)
+        for j in range(nr_blocks):
+            matrix_line.append(-1 if j in block_pair else 0)
+        coefficient_matrix.append(matrix_line)
+    # add the linear equations that set the values of the low-level coefficients
+    for i in range(model.get_nr_features()):
+        coefficient_matrix.append([0] * model.get_nr_coefficients())
+        coefficient_matrix[-1][i] = 1
+    return np.array(coefficient_matrix, dtype=float)
+
+
+def random_block_landscape_coefficients(model, nr_landscapes, rng=None):
+    # returns the low-level coefficients (nr_landscapes x nr_features), the high-level coefficients
+    # (nr_landscapes x nr_blocks) and the block numbers (nr_landscapes x 2) of nr_landscapes random landscapes
+    # rng is a numpy Generator, by default the global numpy random state is used
+    rng = np.random if rng is None else rng
+    nr_blocks, block_size, nr_features = model.get_nr_blocks(), model.get_block_size(), model.get_nr_features()
+    squared_coefficients_solver = model.get_squared_coefficients_solver()
+    coefficients = np.zeros((0, model.get_nr_coefficients()))
+    while len(coefficients) < nr_landscapes:
+        # draw the squared coefficients from the squared uniform distribution
+        squared_coefficients_low = rng.uniform(low=0.0, high=1.0,
+                                               size=(nr_landscapes - len(coefficients), nr_features)) ** 2
+        squared_coefficients = squared_coefficients_low @ squared_coefficients_solver.T
+        # reject the landscapes with a negative coefficient, and draw them again
+        is_accepted = np.all(squared_coefficients >= 0.0, axis=1)
+        coefficients = np.concatenate((coefficients, np.sqrt(squared_coefficients[is_accepted])))
+    # choose 2 distinct blocks in random order
+    block_nrs = np.argsort(rng.random((nr_landscapes, nr_blocks)), axis=1)[:, :2]
+    # randomly choose the signs of the low-level coefficients
+    coefficients_low = rng.choice([-1, 1], size=(nr_landscapes, nr_features)) * coefficients[:, :nr_features]
+    # set the sign of the high-level coefficients such that best high-level setting corresponds
+    # to the best overall setting (the product of the signs of the block's low-level coefficients),
+    # unless the high-level coefficient dominates one of the low-level coefficients of its block
+    coefficients_high = coefficients[:, nr_features:]
+    block_coefficients_low = np.reshape(coefficients_low, (nr_landscapes, nr_blocks, block_size))
+    random_signs = rng.choice([-1, 1], size=(nr_landscapes, nr_blocks))
+    has_random_sign = np.any(coefficients_high[:, :, np.newaxis] > np.abs(block_coefficients_low), axis=2)
+    signs = np.where(np.prod(np.sign(block_coefficients_low), axis=2) < 0, -1, 1)
+    coefficients_high = np.where(has_random_sign, random_signs, signs) * coefficients_high
+    return coefficients_low, coefficients_high, block_nrs
+
@@ -0,0 +1,87 @@
+"""
+Defines the bit-packed encoding of colour combinations and lookup tables over it.
+A combination is encoded as a uint8 bit mask where bit 7 - i is set if feature i is 1. The code of a combination
+is therefore its index in product([-1, 1], repeat=8) (the same order as getAllCombinations in the experiment).
+- combination_codes: all codes
+- indexed_combinations: the combination tuple of every code
+- combination_features: the 8 low-level and 4 high-level features of every code
+- high_level_suggestion_indices: code -> index in all_high_level_suggestions()
+- low_level_suggestion_indices: (block_nr1, block_nr2, code) -> index in all_low_level_suggestions()
+- block_settings: the 4 settings of the two features of a block, in product([-1, 1], repeat=2) order
+- block_setting_features: the two low-level features and the high-level feature of every block setting
+
+Utilities:
+- encode_combination / decode_combination: convert between tuples and codes
+- high_level_code: high-level features of a code (bit set if the two features of a block are the same)
+- hamming_distance
+- high_level_suggestion_index
+- low_level_suggestion_index
+- block_settings_code: code of the combination with the given setting index for each of the 4 blocks
+"""
+
+import numpy as np
+from itertools import product
+
+combination_codes = np.arange(256, dtype=np.uint8)
+indexed_combinations = list(product([-1, 1], repeat=8))
+
+block_settings = np.array(list(product([-1, 1], repeat=2)))
+block_setting_features = np.column_stack((block_settings, np.prod(block_settings, axis=1))).astype(float)
+
+_popcounts = np.array([bin(code).count("1") for code in range(256)], dtype=np.uint8)
+
+
+def encode_combination(combination):
+    # codes are passed through, so that every function accepts both tuples and codes
+    if isinstance(combination, (int, np.integer)):
+        return int(combination)
+    code = 0
+    for value in combination:
+        code = 2 * code + (value > 0)
+    return int(code)
+
+
+def decode_combination(combination):
+    return indexed_combinations[encode_combination(combination)]
+
+
+def high_level_code(code):
+    # the XOR of each bit pair is set if the two features of a block differ, so its complement
+    # (kept in bits 6, 4, 2, 0) is the high-level feature, which is then packed into bits 3, 2, 1, 0
+    same_bits = ~(code ^ (code >> 1)) & 0x55
+    return ((same_bits >> 3) & 8) | ((same_bits >> 2) & 4) | ((same_bits >> 1) & 2) | (same_bits & 1)
+
+
+def hamming_distance(code1, code2):
+    return _popcounts[np.bitwise_xor(code1, code2)]
+
+
+def high_level_suggestion_index(high_level_combination):
+    return encode_combination(high_level_combination)
+
+
+def low_level_suggestion_index(low_level_combination1, low_level_combination2):
+    return 4 * encode_combination(low_level_combination1) + encode_combination(low_level_combination2)
+
+
+def block_settings_code(block_setting_indices):
+    # block 0 holds the two highest bits, so the code is the base-4 number of the setting indices
+    # works on a single combination or on stacked combinations, shape (..., 4)
+    return np.asarray(block_setting_indices) @ np.array([64, 16, 4, 1])
+
+
+_combination_bits = ((combination_codes[:, np.newaxis] >> np.arange(7, -1, -1)) & 1).astype(int)
+_high_level_bits = ((high_level_code(combination_codes)[:, np.newaxis] >> np.arange(3, -1, -1)) & 1).astype(int)
+# index of each block's setting in product([-1, 1], repeat=2)
+_block_setting_indices = 2 * _combination_bits[:, 0::2] + _combination_bits[:, 1::2]
+
+combination_features = np.concatenate((2 * _combination_bits - 1, 2 * _high_level_bits - 1), axis=1).astype(float)
+
+high_level_suggestion_indices = high_level_code(combination_codes).astype(int)
+
+low_level_suggestion_indices = np.full((4, 4, 256), -1)
+for _block_nr1 in range(4):
+    for _block_nr2 in range(4):
+        if _block_nr1 != _block_nr2:
+            low_level_suggestion_indices[_block_nr1, _block_nr2] = \
+                4 * _block_setting_indices[:, _block_nr1] + _block_setting_indices[:, _block_nr2]
@@ -1,19 +1,31 @@
 """
 Defines reward landscapes and selections for the bandit experiment.
-- Selection: wraps colour combination & reward
+- Selection: wraps colour combination (stored as a code, see encoding) & reward
 - Landscape: computes and scales rewards for colour combinations
+- LandscapeBatch: many copies of landscapes that only differ in their reward scaling
+- BlockLandscape: computes and scales rewards of the settings of every block for a model of any size (see block_model)
 
 Utilities:
 - gaussian_random: noise generator
+- gaussian_randoms: array version of gaussian_random
+- reward_scaling: scalars and maximum rewards for given minimum rewards
+- noisy_scaled_rewards: adds noise to scaled rewards, and rounds and clips them
+- scaled_values_in_percentage: scales and clips values and expresses them in percentage
+- all_suggestion_values: values of all global and local suggestions of many landscapes at once
+- sorted_suggestion_values
+- random_landscape_coefficients: draws the coefficients of many random landscapes at once
+- generate_random_landscapes
+- generate_random_block_landscapes
 - generate_random_landscape
 - load_landscapes
 """
 
-import random
 import numpy as np
-from itertools import product, combinations
 import json
-from .advisor import high_level_combination
+from .advisor import high_level_combination, high_level_suggestion_matrix, low_level_suggestion_matrices
+from .block_model import experiment_model, block_landscape_coefficient_matrix, random_block_landscape_coefficients
+from .encoding import (combination_codes, indexed_combinations, combination_features, encode_combination,
+                       decode_combination)
 
 
 def gaussian_random(variance):
@@ -25,25 +37,73 @@ def gaussian_random(variance):
     return z * standard_dev
 
 
+def gaussian_randoms(variance, size):
+    # draws the same numbers as size consecutive calls of gaussian_random
+    standard_dev = np.sqrt(variance)
+    uniform_randoms = np.reshape(np.random.random(2 * size), (size, 2))
+    u = 1 - uniform_randoms[:, 0]
+    v = uniform_randoms[:, 1]
+    z = np.sqrt(-2.0 * np.log(u)) * np.cos(2.0 * np.pi * v)
+    return z * standard_dev
+
+
+def reward_scaling(min_rewards, min_unscaled_rewards, max_unscaled_rewards, average_reward=100):
+    # find the scalars to achieve the minimum rewards
+    scalars = (min_rewards - average_reward) / min_unscaled_rewards
+    # the scaling is increasing, so the maximum reward is the scaled maximum unscaled reward
+    max_rewards = np.rint(scalars * max_unscaled_rewards + average_reward)
+    return scalars, max_rewards
+
+
+def noisy_scaled_rewards(scaled_rewards, variance, min_rewards, max_rewards):
+    # the noise is drawn in one gaussian_randoms call, in the order of the flattened scaled rewards
+    noise = np.reshape(gaussian_randoms(variance, scaled_rewards.size), scaled_rewards.shape)
+    return np.clip(np.rint(scaled_rewards + noise), min_rewards, max_rewards)
+
+
+def scaled_values_in_percentage(unscaled_values, scalars, min_rewards, max_rewards, average_reward=100):
+    scaled_values = np.clip(scalars * unscaled_values + average_reward, min_rewards, max_rewards)
+    return (scaled_values - min_rewards) / (max_rewards - min_rewards) * 100
+
+
+def all_suggestion_values(coefficients, block_nrs1, block_nrs2):
+    # returns the (unscaled) values of all_high_level_suggestions() and of
+    # all_low_level_suggestions(block_nr1, block_nr2) for every landscape, in two arrays of shape (nr_landscapes, 16)
+    # coefficients has shape (nr_landscapes, 12) (8 low-level and 4 high-level coefficients)
+    high_level_values = coefficients @ high_level_suggestion_matrix.T
+    low_level_values = np.einsum("lsj,lj->ls", low_level_suggestion_matrices[block_nrs1, block_nrs2], coefficients)
+    return high_level_values, low_level_values
+
+
+def sorted_suggestion_values(coefficients, block_nrs1, block_nrs2):
+    # same as all_suggestion_values, but every row is sorted in increasing order
+    high_level_values, low_level_values = all_suggestion_values(coefficients, block_nrs1, block_nrs2)
+    return np.sort(high_level_values, axis=1), np.sort(low_level_values, axis=1)
+
+
 class Selection:
     def __init__(self, combination, reward):
-        self._combination = combination
+        # the combination can be given as a tuple or as a code, and is stored as a code
+        self._code = encode_combination(combination)
         self._reward = reward
 
     def __str__(self):
-        return f"combination: {self._combination}, reward: {self._reward}"
+        return f"combination: {self.get_combination()}, reward: {self._reward}"
 
     def equals(self, other):
-        return tuple(self._combination) == tuple(other.get_combination())
+        return self._code == other.get_code()
 
     def get_reward(self):
         return self._reward
 
+    def get_code(self):
+        return self._code
+
     def get_combination(self):
-        return self._combination
+        return decode_combination(self._code)
 
     def get_high_level_combination(self):
-        return high_level_combination(self._combination)
+        return high_level_combination(self.get_combination())
 
     def get_reward_in_percentage(self, min_reward, max_reward):
         return (self._reward - min_reward) / (max_reward - min_reward) * 100
@@ -51,43 +111,40 @@ class Selection:
 
 class Landscape:
     def combination_unscaled_reward(self, combination):
-        value = 0
-        high_combination = high_level_combination(combination)
-        for i in range(4):
-            value += self._coefficients_high[i] * high_combination[i]
-        for i in range(8):
-            value += self._coefficients_low[i] * combination[i]
-        return value
+        return self._unscaled_rewards[encode_combination(combination)]
 
     def __init__(self, coefficients_low, coefficients_high, block_nr1, block_nr2, id):
         # init the coefficients and the block numbers
-        self._combinations = list(product([-1, 1], repeat=8))
+        # the combinations are shared by all landscapes and stored as codes
+        self._combination_codes = combination_codes
         self._coefficients_low = coefficients_low
         self._coefficients_high = coefficients_high
         self._block_nr1 = block_nr1
         self._block_nr2 = block_nr2
         self._id = id
-        self._unscaled_rewards = [self.combination_unscaled_reward(combination) for combination in self._combinations]
+        self._coefficients = np.concatenate((coefficients_low, coefficients_high))
+        # unscaled reward of every combination, indexed by code
+        self._unscaled_rewards = combination_features @ self._coefficients
 
         self._average_reward = 100
         self._gaussian_variance = 4
         self._min_reward = None
         self._max_reward = None
         self._scalar = None
+        # scaled (unrounded) and non-noisy (rounded and clipped) rewards, indexed by code
+        self._scaled_rewards = None
+        self._rewards = None
 
     def init_scaled_rewards(self):
         # initialise reward scaling
-        self._min_reward = np.random.randint(20, 70)
-        # find the scalar to achieve this minimum reward
-        self._scalar = (self._min_reward - self._average_reward) / np.min(self._unscaled_rewards)
-        scaled_rewards = [self._scalar * reward + self._average_reward for reward in self._unscaled_rewards]
-        self._max_reward = np.max([np.rint(reward) for reward in scaled_rewards])
+        self.init_scaled_rewards_with_min_reward(np.random.randint(20, 70))
 
     def init_scaled_rewards_with_min_reward(self, min_reward):
         self._min_reward = min_reward
-        self._scalar = (self._min_reward - self._average_reward) / np.min(self._unscaled_rewards)
-        scaled_rewards = [self._scalar * reward + self._average_reward for reward in self._unscaled_rewards]
-        self._max_reward = np.max([np.rint(reward) for reward in scaled_rewards])
+        self._scalar, self._max_reward = reward_scaling(self._min_reward, np.min(self._unscaled_rewards),
+                                                        np.max(self._unscaled_rewards), self._average_reward)
+        self._scaled_rewards = self._scalar * self._unscaled_rewards + self._average_reward
+        self._rewards = np.clip(np.rint(self._scaled_rewards), self._min_reward, self._max_reward)
 
     def get_max_reward(self):
         return self._max_reward
@@ -96,13 +153,22 @@ class Landscape:
         return self._min_reward
 
     def get_combinations(self):
-        return self._combinations
+        return indexed_combinations
+
+    def get_combination_codes(self):
+        return self._combination_codes
 
     def get_unscaled_rewards(self):
         return self._unscaled_rewards
 
+    def get_scaled_rewards(self):
+        return self._scaled_rewards
+
+    def get_rewards(self):
+        return self._rewards
+
     def get_random_combination(self):
-        return np.random.choice(self._combinations)
+        return indexed_combinations[np.random.choice(self._combination_codes)]
 
     def get_coefficients_low(self):
         return self._coefficients_low
@@ -110,6 +176,10 @@ class Landscape:
     def get_coefficients_high(self):
         return self._coefficients_high
 
+    def get_coefficients(self):
+        # 8 low-level and 4 high-level coefficients
+        return self._coefficients
+
     def get_block_nr1(self):
         return self._block_nr1
 
@@ -120,30 +190,33 @@ class Landscape:
         return self._id
 
     def selection_with_noisy_reward(self, combination):
-        unscaled_reward = self.combination_unscaled_reward(combination)
-        scaled_reward = self._scalar * unscaled_reward + self._average_reward
+        scaled_reward = self._scaled_rewards[encode_combination(combination)]
         noisy_reward = np.rint(scaled_reward + gaussian_random(self._gaussian_variance))
         clipped_reward = max(self._min_reward, min(self._max_reward, noisy_reward))
         selection = Selection(combination, clipped_reward)
         return selection
 
+    def noisy_rewards(self, combination_codes):
+        # noisy rewards of an array of combinations (given as codes), drawn in one call
+        return noisy_scaled_rewards(self._scaled_rewards[combination_codes], self._gaussian_variance,
+                                    self._min_reward, self._max_reward)
+
     def selection_with_non_noisy_reward(self, combination):
-        unscaled_reward = self.combination_unscaled_reward(combination)
-        scaled_reward = np.rint(self._scalar * unscaled_reward + self._average_reward)
+        scaled_reward = np.rint(self._scaled_rewards[encode_combination(combination)])
         clipped_reward = max(self._min_reward, min(self._max_reward, scaled_reward))
         selection = Selection(combination, clipped_reward)
         return selection
 
     def suggestion_value(self, suggestion):
-        value = 0.0
-        low_level_combination, high_level_combination = suggestion.suggestion_values()
-        for i in range(4):
-            if high_level_combination[i] is not None:
-                value += self._coefficients_high[i] * high_level_combination[i]
-        for i in range(8):
-            if low_level_combination[i] is not None:
-                value += self._coefficients_low[i] * low_level_combination[i]
-        return value
+        return suggestion.suggestion_vector() @ self._coefficients
+
+    def high_level_suggestion_values(self):
+        # values of all_high_level_suggestions()
+        return high_level_suggestion_matrix @ self._coefficients
+
+    def low_level_suggestion_values(self):
+        # values of all_low_level_suggestions(block_nr1, block_nr2)
+        return low_level_suggestion_matrices[self._block_nr1, self._block_nr2] @ self._coefficients
 
     def scaled_suggestion_value(self, suggestion):
         unscaled_value = self.suggestion_value(suggestion)
@@ -156,60 +229,214 @@ class Landscape:
         return (scaled_value - self._min_reward) / (self._max_reward - self._min_reward) * 100
 
 
+class LandscapeBatch:
+    # holds nr_copies copies of each landscape, copy i is a copy of landscapes[i % len(landscapes)]
+    # the coefficients and rewards are stored once per landscape, the scaling is stored per copy
+    def __init__(self, landscapes, nr_copies):
+        self._landscapes = landscapes
+        self._landscape_indices = np.tile(np.arange(len(landscapes)), nr_copies)
+        self._nr_landscapes = len(self._landscape_indices)
+        self._block_nrs1 = np.array([landscape.get_block_nr1() for landscape in landscapes])[self._landscape_indices]
+        self._block_nrs2 = np.array([landscape.get_block_nr2() for landscape in landscapes])[self._landscape_indices]
+        self._unscaled_rewards = np.array([landscape.get_unscaled_rewards() for landscape in landscapes])
+        self._high_level_suggestion_values, self._low_level_suggestion_values = all_suggestion_values(
+            np.array([landscape.get_coefficients() for landscape in landscapes]),
+            np.array([landscape.get_block_nr1() for landscape in landscapes]),
+            np.array([landscape.get_block_nr2() for landscape in landscapes]))
+
+        self._average_reward = 100
+        self._gaussian_variance = 4
+        self._min_rewards = None
+        self._max_rewards = None
+        self._scalars = None
+
+    def init_scaled_rewards(self):
+        # initialise the reward scaling of every copy
+        self.init_scaled_rewards_with_min_rewards(np.random.randint(20, 70, size=self._nr_landscapes))
+
+    def init_scaled_rewards_with_min_rewards(self, min_rewards):
+        self._min_rewards = np.array(min_rewards)
+        min_unscaled_rewards = np.min(self._unscaled_rewards, axis=1)[self._landscape_indices]
+        max_unscaled_rewards = np.max(self._unscaled_rewards, axis=1)[self._landscape_indices]
+        self._scalars, self._max_rewards = reward_scaling(self._min_rewards, min_unscaled_rewards,
+                                                          max_unscaled_rewards, self._average_reward)
+
+    def get_nr_landscapes(self):
+        return self._nr_landscapes
+
+    def get_landscapes(self):
+        return self._landscapes
+
+    def get_landscape_indices(self):
+        return self._landscape_indices
+
+    def get_block_nrs1(self):
+        return self._block_nrs1
+
+    def get_block_nrs2(self):
+        return self._block_nrs2
+
+    def get_min_rewards(self):
+        return self._min_rewards
+
+    def get_max_rewards(self):
+        return self._max_rewards
+
+    def noisy_rewards(self, combination_codes):
+        # noisy reward of copy i for the combination combination_codes[i]
+        unscaled_rewards = self._unscaled_rewards[self._landscape_indices, combination_codes]
+        scaled_rewards = self._scalars * unscaled_rewards + self._average_reward
+        return noisy_scaled_rewards(scaled_rewards, self._gaussian_variance, self._min_rewards, self._max_rewards)
+
+    def selections_with_noisy_rewards(self, combination_codes):
+        noisy_rewards = self.noisy_rewards(combination_codes)
+        return [Selection(code, reward) for code, reward in zip(combination_codes, noisy_rewards)]
+
+    def rewards_in_percentage(self, rewards):
+        return (rewards - self._min_rewards) / (self._max_rewards - self._min_rewards) * 100
+
+    def _values_in_percentage(self, unscaled_values):
+        # scales and clips the values of every copy (one row per copy) and expresses them in percentage
+        scalars = self._scalars.reshape((-1,) + (1,) * (unscaled_values.ndim - 1))
+        min_rewards = self._min_rewards.reshape(scalars.shape)
+        max_rewards = self._max_rewards.reshape(scalars.shape)
+        return scaled_values_in_percentage(unscaled_values, scalars, min_rewards, max_rewards, self._average_reward)
+
+    def all_suggestion_values_in_percentage_high_level(self):
+        # values of all_high_level_suggestions() for every copy, shape (nr_landscapes, 16)
+        return self._values_in_percentage(self._high_level_suggestion_values[self._landscape_indices])
+
+    def all_suggestion_values_in_percentage_low_level(self):
+        return self._values_in_percentage(self._low_level_suggestion_values[self._landscape_indices])
+
+    def suggestion_values_in_percentage_high_level(self, suggestion_indices):
+        # value of the suggestion with index suggestion_indices[i] in all_high_level_suggestions() for copy i
+        unscaled_values = self._high_level_suggestion_values[self._landscape_indices, suggestion_indices]
+        return self._values_in_percentage(unscaled_values)
+
+    def suggestion_values_in_percentage_low_level(self, suggestion_indices):
+        unscaled_values = self._low_level_suggestion_values[self._landscape_indices, suggestion_indices]
+        return self._values_in_percentage(unscaled_values)
+
+
+class BlockLandscape:
+    def __init__(self, model, coefficients_low, coefficients_high, block_nr1, block_nr2, id):
+        self._model = model
+        self._coefficients_low = coefficients_low
+        self._coefficients_high = coefficients_high
+        self._block_nr1 = block_nr1
+        self._block_nr2 = block_nr2
+        self._id = id
+        self._coefficients = np.concatenate((coefficients_low, coefficients_high))
+        # unscaled reward of every setting of every block, shape (nr_blocks, nr_settings)
+        self._unscaled_block_rewards = model.block_values(self._coefficients)
+
+        self._average_reward = 100
+        self._gaussian_variance = 4
+        self._min_reward = None
+        self._max_reward = None
+        self._scalar = None
+
+    def init_scaled_rewards(self):
+        # initialise reward scaling
+        self.init_scaled_rewards_with_min_reward(np.random.randint(20, 70))
+
+    def init_scaled_rewards_with_min_reward(self, min_reward):
+        self._min_reward = min_reward
+        # the minimum (maximum) unscaled reward combines the minimum (maximum) setting of every block
+        self._scalar, self._max_reward = reward_scaling(self._min_reward,
+                                                        np.sum(np.min(self._unscaled_block_rewards, axis=1)),
+                                                        np.sum(np.max(self._unscaled_block_rewards, axis=1)),
+                                                        self._average_reward)
+
+    def get_model(self):
+        return self._model
+
+    def get_max_reward(self):
+        return self._max_reward
+
+    def get_min_reward(self):
+        return self._min_reward
+
+    def get_unscaled_block_rewards(self):
+        return self._unscaled_block_rewards
+
+    def get_coefficients_low(self):
+        return self._coefficients_low
+
+    def get_coefficients_high(self):
+        return self._coefficients_high
+
+    def get_coefficients(self):
+        return self._coefficients
+
+    def get_block_nr1(self):
+        return self._block_nr1
+
+    def get_block_nr2(self):
+        return self._block_nr2
+
+    def get_id(self):
+        return self._id
+
+    def unscaled_rewards(self, setting_indices):
+        # unscaled rewards of combinations given by their setting indices, shape (..., nr_blocks)
+        block_nrs = np.arange(self._model.get_nr_blocks())
+        return np.sum(self._unscaled_block_rewards[block_nrs, setting_indices], axis=-1)
+
+    def scaled_rewards(self, setting_indices):
+        return self._scalar * self.unscaled_rewards(setting_indices) + self._average_reward
+
+    def rewards(self, setting_indices):
+        # non-noisy (rounded and clipped) rewards
+        return np.clip(np.rint(self.scaled_rewards(setting_indices)), self._min_reward, self._max_reward)
+
+    def noisy_rewards(self, setting_indices):
+        scaled_rewards = np.atleast_1d(self.scaled_rewards(setting_indices))
+        return noisy_scaled_rewards(scaled_rewards, self._gaussian_variance, self._min_reward, self._max_reward)
+
+    def high_level_suggestion_value(self, high_level_combination):
+        # a high-level suggestion sets the high-level feature of every block
+        return np.asarray(high_level_combination) @ self._coefficients[self._model.get_nr_features():]
+
+    def low_level_suggestion_values(self):
+        # a low-level suggestion sets the features of block_nr1 and block_nr2, its value is the sum of
+        # the values of both block settings, shape (nr_settings, nr_settings)
+        return (self._unscaled_block_rewards[self._block_nr1][:, np.newaxis] +
+                self._unscaled_block_rewards[self._block_nr2][np.newaxis, :])
+
+    def values_in_percentage(self, unscaled_values):
+        return scaled_values_in_percentage(unscaled_values, self._scalar, self._min_reward, self._max_reward,
+                                           self._average_reward)
+
+
+def landscape_coefficient_matrix():
+    # the 6 linear equations that ensure equal variance for low- and high-level advice (these 6 equations have
+    # rank 4), and the 8 linear equations that set the values of the low-level coefficients
+    return block_landscape_coefficient_matrix(experiment_model)
+
+
+def random_landscape_coefficients(nr_landscapes, rng=None):
+    # returns the low-level coefficients (nr_landscapes x 8), the high-level coefficients (nr_landscapes x 4)
+    # and the block numbers (nr_landscapes x 2) of nr_landscapes random landscapes
+    # rng is a numpy Generator, by default the global numpy random state is used
+    return random_block_landscape_coefficients(experiment_model, nr_landscapes, rng)
+
+
+def generate_random_landscapes(nr_landscapes, rng=None):
+    coefficients_low, coefficients_high, block_nrs = random_landscape_coefficients(nr_landscapes, rng)
+    return [Landscape(coefficients_low[i].tolist(), coefficients_high[i].tolist(), int(block_nrs[i, 0]),
+                      int(block_nrs[i, 1]), 0) for i in range(nr_landscapes)]
+
+
+def generate_random_block_landscapes(model, nr_landscapes, rng=None):
+    coefficients_low, coefficients_high, block_nrs = random_block_landscape_coefficients(model, nr_landscapes, rng)
+    return [BlockLandscape(model, coefficients_low[i], coefficients_high[i], int(block_nrs[i, 0]),
+                           int(block_nrs[i, 1]), 0) for i in range(nr_landscapes)]
+
+
 def generate_random_landscape():
-    # add the 6 linear equations that ensure equal variance for low- and high-level advice
-    # (these 6 equations have rank 4)
-    block_pairs = list(combinations([0, 1, 2, 3], 2))
-    coefficient_matrix = []
-    for i in range(len(block_pairs)):
-        matrix_line = []
-        for j in range(4):
-            if j in block_pairs[i]:
-                matrix_line.append(0)
-                matrix_line.append(0)
-            else:
-                matrix_line.append(1)
-                matrix_line.append(1)
-        for j in range(4):
-            if j in block_pairs[i]:
-                matrix_line.append(-1)
-            else:
-                matrix_line.append(0)
-        coefficient_matrix.append(matrix_line)
-    # add the 8 linear equations that set the values of the low-level coefficients
-    for i in range(8):
-        coefficient_matrix.append([0] * 12)
-        coefficient_matrix[-1][i] = 1
-    coefficient_matrix = np.matrix(coefficient_matrix)
-    # add the dependent values
-    dependent_values = [0.0] * 6
-    for i in range(8):
-        # draw the squared coefficients from the squared uniform distribution
-        dependent_values.append(np.random.uniform(low=0.0, high=1.0) ** 2)
-    coefficients = np.linalg.lstsq(coefficient_matrix, dependent_values, rcond=None)[0]
-    for i in range(len(coefficients)):
-        if coefficients[i] < 0.0:
-            # try again if there is a negative coefficient
-            return generate_random_landscape()
-        # take the root of the coefficients
-        coefficients[i] = np.sqrt(coefficients[i])
-    block_nrs = np.random.choice([0, 1, 2, 3], 2, replace=False)
-    # randomly choose the signs of the low-level coefficients
-    coefficient_scalar = random.choice(list(product([-1, 1], repeat=8)))
-    coefficients_low = [coefficient_scalar[i] * coefficients[i] for i in range(8)]
-    # set the sign of the high-level coefficients such that best high-level setting corresponds
-    # to the best overall setting
-    coefficients_high = coefficients[8:]
-    for i in range(4):
-        if coefficients_high[i] > abs(coefficients_low[2 * i]) or coefficients_high[i] > abs(
-                coefficients_low[2 * i + 1]):
-            coefficients_high[i] = np.random.choice([-1, 1]) * coefficients_high[i]
-        else:
-            same_low_coefficient_settings_sum = abs(coefficients_low[2 * i] + coefficients_low[2 * i + 1])
-            different_low_coefficient_settings_sum = abs(-coefficients_low[2 * i] + coefficients_low[2 * i + 1])
-            if same_low_coefficient_settings_sum < different_low_coefficient_settings_sum:
-                coefficients_high[i] = -coefficients_high[i]
-    return Landscape(coefficients_low, coefficients_high, int(block_nrs[0]), int(block_nrs[1]), 0)
+    return generate_random_landscapes(1)[0]
 
 
 def load_landscapes(filename):
@@ -0,0 +1,68 @@
+"""
+Defines graph statistics of many reward landscapes at once, on the graph of local and global neighbours (see topology).
+The rewards of a landscape are a vector of 256 rewards indexed by code, and the functions take stacked reward vectors
+of shape (nr_landscapes, 256). Only the order of the rewards matters, so unscaled rewards can be used.
+- landscape_rewards: unscaled rewards of every landscape
+- local_optima: whether every combination has no neighbour with a higher reward
+- nr_local_optima
+- greedy_ascent_steps: best neighbour of every combination, or the combination itself if it is a local optimum
+- greedy_ascent_optima: local optimum that greedy ascent reaches from every combination
+- basin_sizes: number of combinations from which greedy ascent reaches every combination
+- suggestion_best_ranks: rank of the best combination of every suggestion
+"""
+
+import numpy as np
+from .encoding import combination_features
+from .topology import neighbour_indices
+
+
+def landscape_rewards(coefficients):
+    # coefficients has shape (nr_landscapes, 12) (8 low-level and 4 high-level coefficients)
+    return coefficients @ combination_features.T
+
+
+def local_optima(rewards):
+    return np.all(rewards[:, :, np.newaxis] >= rewards[:, neighbour_indices], axis=2)
+
+
+def nr_local_optima(rewards):
+    return np.count_nonzero(local_optima(rewards), axis=1)
+
+
+def greedy_ascent_steps(rewards):
+    # the combination itself comes first, so that it is kept when no neighbour has a higher reward
+    candidate_indices = np.column_stack((np.arange(rewards.shape[1]), neighbour_indices))
+    best_candidates = np.argmax(rewards[:, candidate_indices], axis=2)
+    return candidate_indices[np.arange(rewards.shape[1]), best_candidates]
+
+
+def greedy_ascent_optima(rewards):
+    # pointer jumping: after k iterations, every pointer has followed 2^k steps of greedy ascent
+    pointers = greedy_ascent_steps(rewards)
+    while True:
+        next_pointers = np.take_along_axis(pointers, pointers, axis=1)
+        if np.array_equal(next_pointers, pointers):
+            return pointers
+        pointers = next_pointers
+
+
+def basin_sizes(rewards):
+    # zero for combinations that are not local optima
+    nr_landscapes, nr_combinations = rewards.shape
+    optima = greedy_ascent_optima(rewards) + nr_combinations * np.arange(nr_landscapes)[:, np.newaxis]
+    return np.bincount(optima.ravel(), minlength=nr_landscapes * nr_combinations).reshape(rewards.shape)
+
+
+def suggestion_best_ranks(rewards, suggestion_indices, nr_suggestions=16):
+    # suggestion_indices has shape (256,) or (nr_landscapes, 256), and maps every code to its suggestion,
+    # e.g. high_level_suggestion_indices or low_level_suggestion_indices[block_nrs1, block_nrs2]
+    # returns the rank (1 for the best combination of the landscape) of the best combination of every suggestion,
+    # shape (nr_landscapes, nr_suggestions)
+    nr_landscapes, nr_combinations = rewards.shape
+    order = np.argsort(-rewards, axis=1, kind="stable")
+    ranks = np.empty(rewards.shape, dtype=int)
+    np.put_along_axis(ranks, order, np.arange(1, nr_combinations + 1)[np.newaxis, :], axis=1)
+    best_ranks = np.full((nr_landscapes, nr_suggestions), nr_combinations + 1)
+    np.minimum.at(best_ranks, (np.arange(nr_landscapes)[:, np.newaxis],
+                               np.broadcast_to(suggestion_indices, rewards.shape)), ranks)
+    return best_ranks
@@ -0,0 +1,81 @@
+"""
+Defines a resumable process pool runner for the simulation scripts.
+A script splits its work into shards (e.g. landscapes or trios), every shard is run in a worker process with its own
+seed of the global numpy random state, and its JSON result is saved in its own file together with a key of its
+inputs (function, seed, shard and settings). Shards whose file already exists with the same key are loaded instead of
+run again, so an interrupted run continues where it stopped, and shards of another configuration are run again.
+The script merges the results into its output files.
+- run_shards: runs a function on all shards and returns their results in shard order
+
+Utilities:
+- shard_seed: independent seed of a shard, derived from the seed of the run
+- shard_key: hash of the inputs of a shard
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from multiprocessing import Pool
+from tqdm import tqdm
+
+
+def shard_seed(seed, shard_nr):
+    return int(np.random.SeedSequence([seed, shard_nr]).generate_state(1)[0])
+
+
+def shard_key(function, shard_input, seed, shard_nr, settings=None):
+    # shard_input and settings have to be JSON serialisable
+    key_json = json.dumps({"function": f"{function.__module__}.{function.__qualname__}", "seed": seed,
+                           "shard_nr": shard_nr, "shard": shard_input, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+
+def _load_shard_result(shard_path, key):
+    # returns None if the shard has not been run, or has been run with other inputs (or by an older runner)
+    if not os.path.exists(shard_path):
+        return None
+    with open(shard_path, "r", encoding="utf-8") as file:
+        shard_json = json.load(file)
+    if not isinstance(shard_json, dict) or shard_json.get("key") != key:
+        return None
+    return shard_json["result"]
+
+
+def _run_shard(arguments):
+    function, shard, seed, shard_path, key = arguments
+    np.random.seed(seed)
+    result = function(shard)
+    # write to a temporary file first, so that an interrupted write is not mistaken for a finished shard
+    with open(shard_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({"key": key, "result": result}, file, ensure_ascii=False, indent=4)
+    os.replace(shard_path + ".tmp", shard_path)
+    return result
+
+
+def run_shards(function, shards, seed, shards_directory, nr_processes=None, settings=None, shard_inputs=None):
+    # returns [function(shard) for shard in shards], where function returns a JSON serialisable result
+    # shard i runs with np.random seeded by shard_seed(seed, i) and saves its result in shards_directory/i.json
+    # the shards are run in nr_processes worker processes (by default one per core), or in this process if 1
+    # a saved result is only reused if its shard_key is the same, the key covers the shards (or shard_inputs, JSON
+    # serialisable descriptions of them if the shards are not JSON serialisable) and settings, which has to contain
+    # every other value the function depends on (e.g. the configuration variables of the script)
+    shard_inputs = shards if shard_inputs is None else shard_inputs
+    os.makedirs(shards_directory, exist_ok=True)
+    shard_paths = [os.path.join(shards_directory, f"{shard_nr}.json") for shard_nr in range(len(shards))]
+    results = [None for _ in shards]
+    remaining_arguments = []
+    for shard_nr, (shard, shard_input, shard_path) in enumerate(zip(shards, shard_inputs, shard_paths)):
+        key = shard_key(function, shard_input, seed, shard_nr, settings)
+        results[shard_nr] = _load_shard_result(shard_path, key)
+        if results[shard_nr] is None:
+            remaining_arguments.append((function, shard, shard_seed(seed, shard_nr), shard_path, key))
+    remaining_shard_nrs = [shard_nr for shard_nr in range(len(shards)) if results[shard_nr] is None]
+    if nr_processes == 1:
+        remaining_results = [_run_shard(arguments) for arguments in tqdm(remaining_arguments)]
+    else:
+        with Pool(nr_processes) as pool:
+            remaining_results = list(tqdm(pool.imap(_run_shard, remaining_arguments), total=len(remaining_arguments)))
+    for shard_nr, result in zip(remaining_shard_nrs, remaining_results):
+        results[shard_nr] = result
+    return results
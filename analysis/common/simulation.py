@@ -0,0 +1,222 @@
+"""
+Defines the advisor simulations on batches of landscapes.
+- mean_advisor_rewards_after_random_selections: AI value of the global or local advisor after being fed
+  random (combination, reward) pairs
+- mean_advisor_rewards_after_random_selections_paired: same for both advisor types, fed one shared history
+- advisor_reward_statistics_after_random_selections: TrialStatistics of the AI values of the advisor types
+- advisor_reward_statistics_with_repeats: same for repeated copies of landscapes, optionally with as many repeats
+  as needed for a target confidence interval
+- counterfactual_advisor_statistics: followed frequencies and AI values of advisors replaying observed selections
+- suggestion_order_counts_after_random_selections: true order of the best suggestion of the global and local advisors
+  after being fed random (combination, reward) pairs
+- suggestion_order_counts_shard: same for a shard of random landscapes, for run_shards
+
+Utilities:
+- random_landscape_batches: random landscapes in batches of bounded size
+- suggestion_orders: true order of every suggestion by value
+"""
+
+import numpy as np
+from .advisor import BatchAdvisor
+from .block_model import sample_indices
+from .landscape import LandscapeBatch, all_suggestion_values, generate_random_landscapes
+from .accumulators import SuggestionOrderCounts, TrialStatistics
+
+
+def _advisor_trial_rewards(advisor, landscape_batch, advisor_type, sampled_codes, exact_expectation):
+    # AI value (in percentage) of the advisor's suggestion for every landscape of the batch
+    # with exact_expectation, this is the expected value of the advisor's suggestion
+    # (weighted by the exact suggestion probabilities) instead of the value of the suggestion matching sampled_codes
+    if exact_expectation and advisor_type == "high":
+        return np.sum(advisor.suggestion_probabilities_high_level() *
+                      landscape_batch.all_suggestion_values_in_percentage_high_level(), axis=1)
+    if exact_expectation:
+        return np.sum(advisor.suggestion_probabilities_low_level() *
+                      landscape_batch.all_suggestion_values_in_percentage_low_level(), axis=1)
+    if advisor_type == "high":
+        suggestion_indices = advisor.matching_suggestion_indices_high_level(sampled_codes)
+        return landscape_batch.suggestion_values_in_percentage_high_level(suggestion_indices)
+    suggestion_indices = advisor.matching_suggestion_indices_low_level(sampled_codes)
+    return landscape_batch.suggestion_values_in_percentage_low_level(suggestion_indices)
+
+
+def advisor_reward_statistics_after_random_selections(landscape_batch, nr_trials, advisor_types,
+                                                      exact_expectation=False, histogram_edges=None):
+    # returns a TrialStatistics of the AI values (in percentage) of every advisor type in advisor_types, over the
+    # landscapes of the batch (see mean_advisor_rewards_after_random_selections)
+    # all landscapes of the batch are simulated in lockstep by a single batch of advisors
+    # the coefficients of the global and local advisors are the same, so all advisor types share one fit per trial,
+    # one sampled combination (mapped to the suggestion of each type) and one history of random selections
+    nr_landscapes = landscape_batch.get_nr_landscapes()
+    advisor = BatchAdvisor(landscape_batch.get_block_nrs1(), landscape_batch.get_block_nrs2())
+    rewards_statistics = [TrialStatistics(nr_trials, histogram_edges) for _ in advisor_types]
+    for trial in range(nr_trials):
+        sampled_codes = None if exact_expectation else advisor.sample_combination_indices()
+        for advisor_type, reward_statistics in zip(advisor_types, rewards_statistics):
+            reward_statistics.add_trial(trial, _advisor_trial_rewards(advisor, landscape_batch, advisor_type,
+                                                                      sampled_codes, exact_expectation))
+        random_codes = np.random.randint(low=0, high=256, size=nr_landscapes)
+        advisor.update_with_rewards(random_codes, landscape_batch.noisy_rewards(random_codes))
+    return rewards_statistics
+
+
+def advisor_reward_statistics_with_repeats(landscapes, nr_trials, advisor_types, max_nr_repeats,
+                                           exact_expectation=False, paired=False, target_half_width=None,
+                                           batch_nr_repeats=20, z_value=1.96):
+    # returns the TrialStatistics of every advisor type over repeated copies of the landscapes (with random reward
+    # scaling), and the number of repeats
+    # without target_half_width, every landscape is repeated max_nr_repeats times in a single batch
+    # otherwise, batches of batch_nr_repeats repeats are simulated until the confidence interval half-width
+    # z_value * standard error of the mean AI value of every trial and advisor type is at most target_half_width,
+    # or until max_nr_repeats repeats
+    # if paired, the advisor types share their random selections (see advisor_reward_statistics_after_random_selections)
+    if target_half_width is None:
+        batch_nr_repeats = max_nr_repeats
+    rewards_statistics = [TrialStatistics(nr_trials) for _ in advisor_types]
+    nr_repeats = 0
+    while nr_repeats < max_nr_repeats:
+        landscape_batch = LandscapeBatch(landscapes, min(batch_nr_repeats, max_nr_repeats - nr_repeats))
+        landscape_batch.init_scaled_rewards()
+        if paired:
+            batch_statistics = advisor_reward_statistics_after_random_selections(landscape_batch, nr_trials,
+                                                                                 advisor_types, exact_expectation)
+        else:
+            batch_statistics = [advisor_reward_statistics_after_random_selections(landscape_batch, nr_trials,
+                                                                                  [advisor_type],
+                                                                                  exact_expectation)[0]
+                                for advisor_type in advisor_types]
+        for reward_statistics, statistics in zip(rewards_statistics, batch_statistics):
+            reward_statistics.merge(statistics)
+        nr_repeats += landscape_batch.get_nr_landscapes() // len(landscapes)
+        if target_half_width is not None and all(
+                np.all(reward_statistics.get_counts() > 1) and
+                np.max(z_value * reward_statistics.standard_errors()) <= target_half_width
+                for reward_statistics in rewards_statistics):
+            break
+    return rewards_statistics, nr_repeats
+
+
+def mean_advisor_rewards_after_random_selections(landscape_batch, nr_trials, advisor_type, exact_expectation=False):
+    # returns a list (for either high- or low-level) with the reward received (in percentage)
+    # by randomly following the advisor's suggestion
+    # item 0 = the reward received after the advisor is fed 0 random (combination, reward) pairs
+    # item 1 = the reward received after the advisor is fed 1 random (combination, reward) pair
+    # ...
+    # item 19 = the reward received after the advisor is fed nr_trials - 1 random (combination, reward) pairs
+    # with exact_expectation, only the random selections and the noisy rewards remain random
+    reward_statistics, = advisor_reward_statistics_after_random_selections(landscape_batch, nr_trials, [advisor_type],
+                                                                          exact_expectation)
+    return reward_statistics.get_means()
+
+
+def mean_advisor_rewards_after_random_selections_paired(landscape_batch, nr_trials, exact_expectation=False):
+    # returns the high- and low-level lists of mean_advisor_rewards_after_random_selections, simulated with common
+    # random numbers: both advisor types see the same random selections, noisy rewards and sampled combinations,
+    # which halves the work and reduces the variance of the high - low difference
+    high_statistics, low_statistics = advisor_reward_statistics_after_random_selections(landscape_batch, nr_trials,
+                                                                                        ["high", "low"],
+                                                                                        exact_expectation)
+    return high_statistics.get_means(), low_statistics.get_means()
+
+
+def counterfactual_advisor_statistics(coefficients, block_nrs1, block_nrs2, reward_scalars, min_rewards, max_rewards,
+                                      combination_codes, rewards, advisor_types, nr_draws=100,
+                                      exact_probabilities=False):
+    # replays observed rounds: in trial t of round i, combination_codes[i, t] was selected with reward rewards[i, t]
+    # returns two arrays of shape (nr_rounds, nr_trials) with, before every selection,
+    # - the frequency (in percentage) with which a suggestion of advisor_types[i] matches the selected combination
+    # - the mean value (in percentage) of the suggestions of advisor_types[i]
+    # both are estimated from nr_draws sampled suggestions, or computed from the exact suggestion probabilities
+    nr_rounds, nr_trials = combination_codes.shape
+    advisor = BatchAdvisor(block_nrs1, block_nrs2)
+    is_high_level = (np.array(advisor_types) == "high")[:, np.newaxis]
+    # value (in percentage) of all suggestions of the advisor type of every round, shape (nr_rounds, 16)
+    high_level_values, low_level_values = all_suggestion_values(coefficients, block_nrs1, block_nrs2)
+    reward_scalars, min_rewards, max_rewards = (np.reshape(array, (-1, 1))
+                                                for array in (reward_scalars, min_rewards, max_rewards))
+    scaled_values = np.clip(reward_scalars * np.where(is_high_level, high_level_values, low_level_values) + 100,
+                            min_rewards, max_rewards)
+    suggestion_values = (scaled_values - min_rewards) / (max_rewards - min_rewards) * 100
+    followed_frequencies = np.zeros((nr_rounds, nr_trials))
+    ai_rewards = np.zeros((nr_rounds, nr_trials))
+    for trial in range(nr_trials):
+        codes = combination_codes[:, trial]
+        selected_suggestion_indices = np.where(is_high_level[:, 0],
+                                               advisor.matching_suggestion_indices_high_level(codes),
+                                               advisor.matching_suggestion_indices_low_level(codes))
+        suggestion_probabilities = np.where(is_high_level, advisor.suggestion_probabilities_high_level(),
+                                            advisor.suggestion_probabilities_low_level())
+        if exact_probabilities:
+            followed_frequencies[:, trial] = 100 * suggestion_probabilities[np.arange(nr_rounds),
+                                                                            selected_suggestion_indices]
+            ai_rewards[:, trial] = np.sum(suggestion_probabilities * suggestion_values, axis=1)
+        else:
+            suggestion_indices = sample_indices(suggestion_probabilities, nr_draws)
+            followed_frequencies[:, trial] = 100 * np.mean(
+                suggestion_indices == selected_suggestion_indices[:, np.newaxis], axis=1)
+            ai_rewards[:, trial] = np.mean(np.take_along_axis(suggestion_values, suggestion_indices, axis=1), axis=1)
+        advisor.update_with_rewards(codes, rewards[:, trial])
+    return followed_frequencies, ai_rewards
+
+
+def random_landscape_batches(nr_landscapes, chunk_size):
+    # yields nr_landscapes random landscapes (with initialised reward scaling) in batches of at most chunk_size,
+    # so that only one batch is held in memory at a time
+    for start in range(0, nr_landscapes, chunk_size):
+        landscape_batch = LandscapeBatch(generate_random_landscapes(min(chunk_size, nr_landscapes - start)), 1)
+        landscape_batch.init_scaled_rewards()
+        yield landscape_batch
+
+
+def suggestion_orders(suggestion_values):
+    # order (1 for the highest value) of every suggestion, suggestions with the same value keep their order
+    # (as in a stable sort in decreasing order of value)
+    sorted_indices = np.argsort(-suggestion_values, axis=-1, kind="stable")
+    orders = np.empty(sorted_indices.shape, dtype=int)
+    np.put_along_axis(orders, sorted_indices, np.arange(1, suggestion_values.shape[-1] + 1), axis=-1)
+    return orders
+
+
+def suggestion_order_counts_after_random_selections(landscape_batch, nr_trials):
+    # returns the SuggestionOrderCounts of the best suggestion (a uniformly random one if there are several)
+    # of the global and of the local advisor in every trial
+    # both advisor types share one fit, one best combination and one history of random selections per landscape
+    nr_landscapes = landscape_batch.get_nr_landscapes()
+    landscape_indices = landscape_batch.get_landscape_indices()
+    landscapes = landscape_batch.get_landscapes()
+    high_level_values, low_level_values = all_suggestion_values(
+        np.array([landscape.get_coefficients() for landscape in landscapes]),
+        np.array([landscape.get_block_nr1() for landscape in landscapes]),
+        np.array([landscape.get_block_nr2() for landscape in landscapes]))
+    high_level_orders = suggestion_orders(high_level_values)[landscape_indices]
+    low_level_orders = suggestion_orders(low_level_values)[landscape_indices]
+    advisor = BatchAdvisor(landscape_batch.get_block_nrs1(), landscape_batch.get_block_nrs2())
+    rows = np.arange(nr_landscapes)
+    high_orders = np.zeros((nr_landscapes, nr_trials), dtype=int)
+    low_orders = np.zeros((nr_landscapes, nr_trials), dtype=int)
+    for trial in range(nr_trials):
+        best_codes = advisor.best_combination_indices()
+        high_orders[:, trial] = high_level_orders[rows, advisor.matching_suggestion_indices_high_level(best_codes)]
+        low_orders[:, trial] = low_level_orders[rows, advisor.matching_suggestion_indices_low_level(best_codes)]
+        random_codes = np.random.randint(low=0, high=256, size=nr_landscapes)
+        advisor.update_with_rewards(random_codes, landscape_batch.noisy_rewards(random_codes))
+    high_counts = SuggestionOrderCounts(nr_trials)
+    high_counts.add(high_orders)
+    low_counts = SuggestionOrderCounts(nr_trials)
+    low_counts.add(low_orders)
+    return high_counts, low_counts
+
+
+def suggestion_order_counts_shard(shard):
+    # shard = (nr_landscapes, nr_trials, chunk_size), streams nr_landscapes random landscapes in batches of at most
+    # chunk_size and returns the merged counts of suggestion_order_counts_after_random_selections as dicts
+    # (defined here, with all parameters in the shard, so that worker processes can load it without fork)
+    nr_landscapes, nr_trials, chunk_size = shard
+    high_counts = SuggestionOrderCounts(nr_trials)
+    low_counts = SuggestionOrderCounts(nr_trials)
+    for landscape_batch in random_landscape_batches(nr_landscapes, chunk_size):
+        batch_high_counts, batch_low_counts = suggestion_order_counts_after_random_selections(landscape_batch,
+                                                                                              nr_trials)
+        high_counts.merge(batch_high_counts)
+        low_counts.merge(batch_low_counts)
+    return {"high": high_counts.to_dict(), "low": low_counts.to_dict()}
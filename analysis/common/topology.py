@@ -0,0 +1,51 @@
+"""
+Defines the graph topology of the combinations, which is the same for every landscape.
+Two combinations are local neighbours if they differ in exactly 1 feature, and global neighbours if they differ in
+exactly 2 features and have the same high-level features. Combinations are identified by their code (see encoding).
+- local_neighbours: (256, 256) boolean adjacency matrix
+- global_neighbours: (256, 256) boolean adjacency matrix
+- neighbour_edges: code pairs (i < j) of all local or global neighbours, shape (nr_edges, 2), in row-major order
+- neighbour_indices: the (local or global) neighbours of every code in increasing order, shape (256, 12)
+
+Utilities:
+- suggestion_group_masks: membership of every combination in every suggestion group
+- first_suggestion_groups: index of the first suggestion group of every combination
+- edge_group_memberships: whether the ends of every edge are in a (common) suggestion group
+- suggestion_group_signature: identifies a set of suggestion groups, e.g. to cache graph layouts
+"""
+
+import hashlib
+import numpy as np
+from .encoding import combination_codes, hamming_distance, high_level_code
+
+_distances = hamming_distance(combination_codes[:, np.newaxis], combination_codes[np.newaxis, :])
+_is_same_high_level = high_level_code(combination_codes)[:, np.newaxis] == high_level_code(combination_codes)
+
+local_neighbours = _distances == 1
+global_neighbours = (_distances == 2) & _is_same_high_level
+neighbour_edges = np.argwhere(np.triu(local_neighbours | global_neighbours, k=1))
+# every code has 8 local and 4 global neighbours
+neighbour_indices = np.argwhere(local_neighbours | global_neighbours)[:, 1].reshape(len(combination_codes), -1)
+
+
+def suggestion_group_masks(suggestions):
+    # shape (nr_groups, 256)
+    return np.array([suggestion.matching_combination_mask() for suggestion in suggestions], dtype=bool)
+
+
+def first_suggestion_groups(group_masks):
+    # index of the first group that contains each combination, -1 if it is in no group
+    return np.where(np.any(group_masks, axis=0), np.argmax(group_masks, axis=0), -1)
+
+
+def edge_group_memberships(group_masks, edges=neighbour_edges):
+    # returns, for every edge, whether both ends are in the same group, and whether both ends are in some group
+    is_within_group = np.any(group_masks[:, edges[:, 0]] & group_masks[:, edges[:, 1]], axis=0)
+    is_in_group = np.any(group_masks, axis=0)
+    return is_within_group, is_in_group[edges[:, 0]] & is_in_group[edges[:, 1]]
+
+
+def suggestion_group_signature(group_masks):
+    # the same for the same groups in any order
+    packed_masks = sorted(np.packbits(mask).tobytes() for mask in group_masks)
+    return hashlib.sha256(b"".join(packed_masks)).hexdigest()[:16]
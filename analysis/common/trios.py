@@ -0,0 +1,295 @@
+"""
+Defines the scoring and preselection of landscape trios.
+A trio is scored by the sum of the absolute differences between the summed sorted global and local suggestion values
+of its landscapes, weighted by the frequency of the suggestions (lower is better).
+- TopTrios: keeps the best scored trios in a bounded heap
+
+Utilities:
+- suggestion_frequency_weights: frequency (in percentage) of the suggestions in increasing order of value
+- global_local_differences: sorted global minus sorted local suggestion values of every landscape
+- trio_scores: scores of stacked trios
+- landscape_json
+- preselect_trios: scores random trios in chunks and keeps the best ones, with checkpoints
+- nearest_neighbours: nearest points in L1 distance
+- pool_trio_indices: searches disjoint low scoring trios among a pool of landscapes (raises a ValueError if the pool
+  has fewer than nr_trios of them)
+- search_pool_trios: same result format as preselect_trios, from a pool of random landscapes
+- greedy_balanced_trio_indices: greedily selects trios whose summed global - local AI values are balanced
+- swap_refined_trio_indices: improves a selection by swapping selected and unselected trios
+- select_balanced_trios: greedy selection followed by swap refinement
+"""
+
+import os
+import json
+import heapq
+import numpy as np
+from tqdm import tqdm
+from .landscape import sorted_suggestion_values, random_landscape_coefficients
+
+suggestion_frequency_weights = np.array(list(reversed([58.78557500000001, 11.128025000000001, 7.1568, 4.552925,
+                                                       3.4429749999999997, 2.6847250000000003, 2.1835500000000003,
+                                                       1.8658499999999996, 1.6677750000000002, 1.4245,
+                                                       1.2241750000000002, 1.0107249999999999, 0.880725,
+                                                       0.7597499999999999, 0.693125, 0.5388])))
+
+
+def global_local_differences(coefficients, block_nrs1, block_nrs2):
+    # shape (nr_landscapes, 16), the score of a trio only depends on the sum of the differences of its landscapes
+    global_values, local_values = sorted_suggestion_values(coefficients, block_nrs1, block_nrs2)
+    return global_values - local_values
+
+
+def trio_scores(trio_differences, weights=suggestion_frequency_weights):
+    # trio_differences has shape (..., 3, 16)
+    return np.sum(np.abs(np.sum(trio_differences, axis=-2)) * weights, axis=-1)
+
+
+def landscape_json(coefficients_low, coefficients_high, block_nr1, block_nr2):
+    return {"coefficients_low": [float(coefficient) for coefficient in coefficients_low],
+            "coefficients_high": [float(coefficient) for coefficient in coefficients_high],
+            "block_nr1": int(block_nr1),
+            "block_nr2": int(block_nr2)}
+
+
+class TopTrios:
+    # keeps the nr_trios trios with the lowest scores, the heap holds (-score, insertion number, trio json)
+    # so that its first item is the worst kept trio
+    def __init__(self, nr_trios):
+        self._nr_trios = nr_trios
+        self._heap = []
+        self._nr_inserted = 0
+
+    def get_max_score(self):
+        # a trio has to score lower to be kept
+        return -self._heap[0][0] if len(self._heap) == self._nr_trios else np.inf
+
+    def push(self, score, trio_json):
+        if score >= self.get_max_score():
+            return
+        item = (-float(score), self._nr_inserted, trio_json)
+        self._nr_inserted += 1
+        if len(self._heap) < self._nr_trios:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+
+    def push_chunk(self, scores, trio_json_function):
+        # only the best nr_trios trios of a chunk can be kept, and the json of a trio is only built if it is kept
+        best_indices = np.argsort(scores, kind="stable")[:self._nr_trios]
+        for i in best_indices:
+            if scores[i] >= self.get_max_score():
+                break
+            self.push(scores[i], trio_json_function(i))
+
+    def get_trios(self):
+        # the kept trios in increasing order of score
+        return [{"trio": trio_json, "score": -negative_score}
+                for negative_score, _, trio_json in sorted(self._heap, key=lambda item: (-item[0], item[1]))]
+
+    def to_dict(self):
+        return {"nr_trios": self._nr_trios, "nr_inserted": self._nr_inserted, "trios": self.get_trios()}
+
+    @staticmethod
+    def from_dict(top_trios_dict):
+        top_trios = TopTrios(top_trios_dict["nr_trios"])
+        for trio in top_trios_dict["trios"]:
+            top_trios.push(trio["score"], trio["trio"])
+        top_trios._nr_inserted = top_trios_dict["nr_inserted"]
+        return top_trios
+
+
+def _save_checkpoint(checkpoint_path, top_trios, nr_candidates):
+    # the global numpy random state is saved as well, so that a resumed run draws the same trios
+    algorithm, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    checkpoint = {"nr_candidates": nr_candidates,
+                  "random_state": [algorithm, keys.tolist(), position, has_gauss, cached_gaussian],
+                  "top_trios": top_trios.to_dict()}
+    with open(checkpoint_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file, ensure_ascii=False)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def _load_checkpoint(checkpoint_path):
+    with open(checkpoint_path, "r", encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    algorithm, keys, position, has_gauss, cached_gaussian = checkpoint["random_state"]
+    np.random.set_state((algorithm, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+    return TopTrios.from_dict(checkpoint["top_trios"]), checkpoint["nr_candidates"]
+
+
+def preselect_trios(nr_trios, total_trios, chunk_size=1000, checkpoint_path=None, checkpoint_interval=100,
+                    landscape_filter=None):
+    # scores total_trios random trios in chunks of chunk_size trios, and returns the nr_trios best trios
+    # (see TopTrios.get_trios)
+    # landscape_filter(coefficients, block_nrs1, block_nrs2) returns whether every landscape is accepted,
+    # trios with a landscape that is not accepted are not kept
+    # if checkpoint_path is given, the state is saved every checkpoint_interval chunks,
+    # and an existing checkpoint is resumed
+    top_trios = TopTrios(nr_trios)
+    nr_candidates = 0
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        top_trios, nr_candidates = _load_checkpoint(checkpoint_path)
+    nr_chunks = 0
+    with tqdm(total=total_trios, initial=nr_candidates) as progress_bar:
+        while nr_candidates < total_trios:
+            chunk_nr_trios = min(chunk_size, total_trios - nr_candidates)
+            coefficients_low, coefficients_high, block_nrs = random_landscape_coefficients(3 * chunk_nr_trios)
+            differences = global_local_differences(np.concatenate((coefficients_low, coefficients_high), axis=1),
+                                                   block_nrs[:, 0], block_nrs[:, 1])
+            scores = trio_scores(np.reshape(differences, (chunk_nr_trios, 3, 16)))
+            if landscape_filter is not None:
+                is_accepted = landscape_filter(np.concatenate((coefficients_low, coefficients_high), axis=1),
+                                               block_nrs[:, 0], block_nrs[:, 1])
+                scores = np.where(np.all(np.reshape(is_accepted, (chunk_nr_trios, 3)), axis=1), scores, np.inf)
+            top_trios.push_chunk(scores, lambda trio_nr: [
+                landscape_json(coefficients_low[i], coefficients_high[i], block_nrs[i, 0], block_nrs[i, 1])
+                for i in range(3 * trio_nr, 3 * trio_nr + 3)])
+            nr_candidates += chunk_nr_trios
+            nr_chunks += 1
+            progress_bar.update(chunk_nr_trios)
+            if checkpoint_path is not None and (nr_chunks % checkpoint_interval == 0 or nr_candidates == total_trios):
+                _save_checkpoint(checkpoint_path, top_trios, nr_candidates)
+    return top_trios.get_trios()
+
+
+def nearest_neighbours(queries, points, nr_neighbours, nr_candidates=None, chunk_size=512):
+    # indices of the nr_neighbours nearest points (in L1 distance) of every query, in increasing order of distance
+    # the L1 distances are only computed for the nr_candidates nearest points in euclidean distance
+    # (by default 4 * nr_neighbours), which come from matrix products
+    nr_candidates = min(len(points), 4 * nr_neighbours if nr_candidates is None else nr_candidates)
+    squared_point_norms = np.sum(points ** 2, axis=1)
+    neighbour_indices = np.zeros((len(queries), nr_neighbours), dtype=int)
+    for start in range(0, len(queries), chunk_size):
+        chunk_queries = queries[start:start + chunk_size]
+        # squared euclidean distances up to the squared query norms, which do not change the order
+        distances = squared_point_norms - 2 * chunk_queries @ points.T
+        candidate_indices = np.argpartition(distances, nr_candidates - 1, axis=1)[:, :nr_candidates]
+        candidate_distances = np.sum(np.abs(chunk_queries[:, np.newaxis, :] - points[candidate_indices]), axis=2)
+        order = np.argsort(candidate_distances, axis=1, kind="stable")[:, :nr_neighbours]
+        neighbour_indices[start:start + chunk_size] = np.take_along_axis(candidate_indices, order, axis=1)
+    return neighbour_indices
+
+
+def _pool_trio_candidates(points, nr_partners):
+    # every landscape is paired with the nr_partners landscapes whose points are nearest to its negated point,
+    # every pair is completed by the landscape whose point is nearest to the negated sum of the pair
+    pool_size = len(points)
+    partner_indices = nearest_neighbours(-points, points, nr_partners + 1)
+    pairs = np.column_stack((np.repeat(np.arange(pool_size), nr_partners + 1), partner_indices.ravel()))
+    pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+    pair_sums = points[pairs[:, 0]] + points[pairs[:, 1]]
+    # at most 2 of the 3 nearest landscapes are in the pair itself
+    third_indices = nearest_neighbours(-pair_sums, points, 3)
+    is_in_pair = (third_indices == pairs[:, :1]) | (third_indices == pairs[:, 1:])
+    third_indices = third_indices[np.arange(len(pairs)), np.argmax(~is_in_pair, axis=1)]
+    trios = np.unique(np.sort(np.column_stack((pairs, third_indices)), axis=1), axis=0)
+    scores = np.sum(np.abs(np.sum(points[trios], axis=1)), axis=1)
+    return trios, scores
+
+
+def _disjoint_trio_numbers(trios, scores, pool_size, nr_trios):
+    # greedy selection of at most nr_trios disjoint trios in increasing order of score
+    is_used = np.zeros(pool_size, dtype=bool)
+    selected_trios = []
+    for trio_nr in np.argsort(scores, kind="stable"):
+        if not np.any(is_used[trios[trio_nr]]):
+            selected_trios.append(trio_nr)
+            is_used[trios[trio_nr]] = True
+            if len(selected_trios) == nr_trios:
+                break
+    return selected_trios
+
+
+def pool_trio_indices(differences, nr_trios, nr_partners=10, weights=suggestion_frequency_weights,
+                      max_nr_partners=None):
+    # differences has shape (pool_size, 16) (see global_local_differences)
+    # returns the landscape indices (nr_trios x 3) and scores of disjoint trios (no landscape is in two trios)
+    # the weighted differences are points, and the score of a trio is the L1 norm of the sum of its points:
+    # the candidate trios are made of near points (see _pool_trio_candidates), and the disjoint trios are selected
+    # greedily in increasing order of score
+    # if fewer than nr_trios disjoint trios are found, the search is repeated with twice as many partners, up to
+    # max_nr_partners (by default 8 * nr_partners), and a ValueError is raised if there are still too few
+    points = differences * weights
+    pool_size = len(points)
+    if pool_size < 3 * nr_trios:
+        raise ValueError(f"a pool of {pool_size} landscapes cannot hold {nr_trios} disjoint trios")
+    max_nr_partners = min(8 * nr_partners if max_nr_partners is None else max_nr_partners, pool_size - 1)
+    nr_partners = min(nr_partners, max_nr_partners)
+    while True:
+        trios, scores = _pool_trio_candidates(points, nr_partners)
+        selected_trios = _disjoint_trio_numbers(trios, scores, pool_size, nr_trios)
+        if len(selected_trios) == nr_trios:
+            return trios[selected_trios], scores[selected_trios]
+        if nr_partners == max_nr_partners:
+            raise ValueError(f"only {len(selected_trios)} of {nr_trios} disjoint trios found in a pool of {pool_size} "
+                             f"landscapes with {nr_partners} partners, use a larger pool or more partners")
+        nr_partners = min(2 * nr_partners, max_nr_partners)
+
+
+def search_pool_trios(nr_trios, pool_size, nr_partners=10, landscape_filter=None):
+    # searches nr_trios disjoint trios among pool_size random landscapes (see pool_trio_indices)
+    # the landscapes that are not accepted by landscape_filter (see preselect_trios) are removed from the pool,
+    # so a strict filter needs a larger pool
+    coefficients_low, coefficients_high, block_nrs = random_landscape_coefficients(pool_size)
+    if landscape_filter is not None:
+        is_accepted = landscape_filter(np.concatenate((coefficients_low, coefficients_high), axis=1),
+                                       block_nrs[:, 0], block_nrs[:, 1])
+        coefficients_low, coefficients_high, block_nrs = (coefficients_low[is_accepted],
+                                                          coefficients_high[is_accepted], block_nrs[is_accepted])
+    differences = global_local_differences(np.concatenate((coefficients_low, coefficients_high), axis=1),
+                                           block_nrs[:, 0], block_nrs[:, 1])
+    trios, scores = pool_trio_indices(differences, nr_trios, nr_partners)
+    return [{"trio": [landscape_json(coefficients_low[i], coefficients_high[i], block_nrs[i, 0], block_nrs[i, 1])
+                      for i in trio],
+             "score": float(score)}
+            for trio, score in zip(trios, scores)]
+
+
+def greedy_balanced_trio_indices(differences, nr_trios):
+    # differences has shape (nr_candidates, nr_trials) (global - local AI values of every candidate trio)
+    # adds the trio that minimises the L1 norm of the summed differences nr_trios times (the first one on ties)
+    difference_sum = np.zeros(differences.shape[1])
+    is_selected = np.zeros(len(differences), dtype=bool)
+    selected_indices = []
+    for _ in range(nr_trios):
+        scores = np.sum(np.abs(difference_sum + differences), axis=1)
+        scores[is_selected] = np.inf
+        trio_index = int(np.argmin(scores))
+        selected_indices.append(trio_index)
+        is_selected[trio_index] = True
+        difference_sum += differences[trio_index]
+    return selected_indices
+
+
+def swap_refined_trio_indices(differences, selected_indices, max_nr_swaps=1000):
+    # local search: replaces a selected trio by an unselected one as long as the best swap lowers the L1 norm
+    # of the summed differences (the position of a replaced trio is kept)
+    selected_indices = list(selected_indices)
+    is_selected = np.zeros(len(differences), dtype=bool)
+    is_selected[selected_indices] = True
+    difference_sum = np.sum(differences[selected_indices], axis=0)
+    score = np.sum(np.abs(difference_sum))
+    for _ in range(max_nr_swaps):
+        best_swap = None
+        best_score = score - 0.000000001
+        for position, trio_index in enumerate(selected_indices):
+            swap_scores = np.sum(np.abs(difference_sum - differences[trio_index] + differences), axis=1)
+            swap_scores[is_selected] = np.inf
+            new_trio_index = int(np.argmin(swap_scores))
+            if swap_scores[new_trio_index] < best_score:
+                best_swap = (position, new_trio_index)
+                best_score = swap_scores[new_trio_index]
+        if best_swap is None:
+            break
+        position, new_trio_index = best_swap
+        is_selected[selected_indices[position]] = False
+        is_selected[new_trio_index] = True
+        difference_sum += differences[new_trio_index] - differences[selected_indices[position]]
+        selected_indices[position] = new_trio_index
+        score = np.sum(np.abs(difference_sum))
+    return selected_indices
+
+
+def select_balanced_trios(differences, nr_trios, max_nr_swaps=0):
+    # by default only the greedy selection is run (the selection of the experiment), max_nr_swaps > 0 refines it
+    return swap_refined_trio_indices(differences, greedy_balanced_trio_indices(differences, nr_trios), max_nr_swaps)
@@ -1,78 +1,48 @@
 """
 Preselects 100 landscape trios from 100,000 random landscapes based on the sum of the absolute differences between the
 sorted global and local suggestion values weighted by the frequency of the suggestions.
+Trios are generated and scored in chunks, and the best trios are kept in a bounded heap (see trios). The progress is
+checkpointed, so an interrupted run is resumed by running the script again.
+Alternatively, searches disjoint trios among a pool of random landscapes, which reuses every landscape in many
+candidate trios and finds much lower scores from far fewer landscapes.
+Optionally, only landscapes with few local optima on the graph of local and global neighbours are used.
 """
 
-import numpy as np
 import json
-from tqdm import tqdm
-from common import all_low_level_suggestions, all_high_level_suggestions, generate_random_landscape
+from common import preselect_trios, search_pool_trios, landscape_rewards, nr_local_optima
 
 
-def sorted_global_local_suggestion_means(landscape):
-    high_level_suggestions = all_high_level_suggestions()
-    high_suggestion_means = []
-    for suggestion in high_level_suggestions:
-        high_suggestion_mean = landscape.suggestion_value(suggestion)
-        high_suggestion_means.append(high_suggestion_mean)
-    high_suggestion_means.sort()
-    low_level_suggestions = all_low_level_suggestions(landscape.get_block_nr1(), landscape.get_block_nr2())
-    low_suggestion_means = []
-    for suggestion in low_level_suggestions:
-        low_suggestion_mean = landscape.suggestion_value(suggestion)
-        low_suggestion_means.append(low_suggestion_mean)
-    low_suggestion_means.sort()
-    return high_suggestion_means, low_suggestion_means
-
-
-def weighted_global_local_means_abs_difference_sum(landscapes):
-    global_means_sum = np.zeros(16)
-    local_means_sum = np.zeros(16)
-    weights = np.array(list(reversed([58.78557500000001, 11.128025000000001, 7.1568, 4.552925, 3.4429749999999997,
-                                      2.6847250000000003, 2.1835500000000003, 1.8658499999999996, 1.6677750000000002,
-                                      1.4245, 1.2241750000000002, 1.0107249999999999, 0.880725, 0.7597499999999999,
-                                      0.693125, 0.5388])))
-    for landscape in landscapes:
-        global_means, local_means = sorted_global_local_suggestion_means(landscape)
-        global_means_sum += np.array(global_means)
-        local_means_sum += np.array(local_means)
-    return np.sum(abs(global_means_sum - local_means_sum) * weights)
+def has_few_local_optima(coefficients, block_nrs1, block_nrs2):
+    return nr_local_optima(landscape_rewards(coefficients)) <= max_nr_local_optima
 
 
 nr_trios = 100
-total_trios = 100000
+# "stream" scores total_trios random trios, "pool" searches trios among pool_size random landscapes
+search_mode = "stream"
 
-landscape_trios = []
-for _ in tqdm(range(total_trios)):
-    landscape1 = generate_random_landscape()
-    landscape2 = generate_random_landscape()
-    landscape3 = generate_random_landscape()
-    landscape1.init_scaled_rewards()
-    landscape2.init_scaled_rewards()
-    landscape3.init_scaled_rewards()
-    trio_score = weighted_global_local_means_abs_difference_sum([landscape1, landscape2, landscape3])
-    if len(landscape_trios) < nr_trios:
-        landscape_trios.append({"landscape1": landscape1, "landscape2": landscape2, "landscape3": landscape3,
-                                "score": trio_score})
-    else:
-        max_score = max([trio["score"] for trio in landscape_trios])
-        if trio_score < max_score:
-            max_score_index = [trio["score"] for trio in landscape_trios].index(max_score)
-            landscape_trios[max_score_index] = {"landscape1": landscape1, "landscape2": landscape2,
-                                                "landscape3": landscape3, "score": trio_score}
-
-landscape_trios_json = []
-landscape_id = 0
-for trio in landscape_trios:
-    landscapes_json = []
-    for landscape in [trio["landscape1"], trio["landscape2"], trio["landscape3"]]:
-        landscapes_json.append({"coefficients_low": list(landscape.get_coefficients_low()),
-                                "coefficients_high": list(landscape.get_coefficients_high()),
-                                "block_nr1": landscape.get_block_nr1(),
-                                "block_nr2": landscape.get_block_nr2()})
-    landscape_trios_json.append({"trio": landscapes_json,
-                                 "score": trio["score"]})
-
-with open(f"landscapes/landscape_trios_{nr_trios}_from_{total_trios}.json", "w",
-          encoding="utf-8") as file:
+total_trios = 100000
+# trios are generated and scored in chunks
+chunk_size = 1000
+checkpoint_path = f"landscapes/landscape_trios_{nr_trios}_from_{total_trios}_checkpoint.json"
+# number of chunks between checkpoints
+checkpoint_interval = 100
+
+pool_size = 10000
+# number of landscapes each landscape is paired with before the pairs are completed to trios (doubled up to 8 times
+# this number if too few disjoint trios are found, the search fails if there are still fewer than nr_trios)
+nr_partners = 10
+
+# keep only landscapes with at most this number of local optima (None for all landscapes)
+max_nr_local_optima = None
+landscape_filter = None if max_nr_local_optima is None else has_few_local_optima
+
+if search_mode == "stream":
+    landscape_trios_json = preselect_trios(nr_trios, total_trios, chunk_size, checkpoint_path, checkpoint_interval,
+                                           landscape_filter)
+    output_path = f"landscapes/landscape_trios_{nr_trios}_from_{total_trios}.json"
+else:
+    landscape_trios_json = search_pool_trios(nr_trios, pool_size, nr_partners, landscape_filter)
+    output_path = f"landscapes/landscape_trios_{nr_trios}_from_pool_{pool_size}.json"
+
+with open(output_path, "w", encoding="utf-8") as file:
     json.dump(landscape_trios_json, file, ensure_ascii=False, indent=4)
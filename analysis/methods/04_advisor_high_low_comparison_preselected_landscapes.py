@@ -1,39 +1,15 @@
 """
 Saves the AI values received by the global and local advisors after being fed random (combination, reward) pairs
 from the preselected landscapes. Loads landscapes from a JSON file, and saves results in a new JSON file.
+Every trio is simulated as a separate shard in a process pool (see runner).
+The standard errors of the mean AI values (over the repeats) are saved as well. Optionally, a trio is only
+repeated until its mean AI values are precise enough, and the number of repeats is saved.
 """
 
-from common import Advisor, Landscape
-import numpy as np
-from tqdm import tqdm
-from copy import deepcopy
+from common import Landscape, advisor_reward_statistics_with_repeats, run_shards
 import json
 
 
-def mean_advisor_rewards_after_random_selections(landscapes, nr_trials, advisor_type):
-    # returns a list (for either high- or low-level) with the reward received (in percentage)
-    # by randomly following the advisor's suggestion
-    # item 0 = the reward received after the advisor is fed 0 random (combination, reward) pairs
-    # item 1 = the reward received after the advisor is fed 1 random (combination, reward) pair
-    # ...
-    # item 19 = the reward received after the advisor is fed nr_trials - 1 random (combination, reward) pairs
-    rounds_rewards = []
-    for landscape in landscapes:
-        all_combinations = landscape.get_combinations()
-        advisor = Advisor(landscape.get_block_nr1(), landscape.get_block_nr2())
-        round_rewards = []
-        for _ in range(nr_trials):
-            suggestion = advisor.sample_suggestion_high_level(
-                all_combinations) if advisor_type == "high" else advisor.sample_suggestion_low_level(all_combinations)
-            suggestion_value = landscape.suggestion_value_in_percentage(suggestion)
-            round_rewards.append(suggestion_value)
-            random_combination = all_combinations[np.random.randint(low=0, high=len(all_combinations))]
-            random_selection = landscape.selection_with_noisy_reward(random_combination)
-            advisor.update_with_selection(random_selection)
-        rounds_rewards.append(round_rewards)
-    return np.mean(rounds_rewards, axis=0)
-
-
 def load_landscape_trios():
     with open(f"landscapes/landscape_trios_100_from_100000.json", "r", encoding="utf-8") as file:
         landscape_trios_json = json.load(file)
@@ -48,33 +24,57 @@ def load_landscape_trios():
     return landscape_trios
 
 
-repeat_landscape = 300
-nr_trials = 20
-
-trios = load_landscape_trios()
-results_json = []
-for trio in tqdm(trios):
-    landscapes = []
-    for _ in range(repeat_landscape):
-        for i in range(3):
-            landscape_copy = deepcopy(trio[i])
-            landscape_copy.init_scaled_rewards()
-            landscapes.append(landscape_copy)
-    high_rewards = mean_advisor_rewards_after_random_selections(landscapes, nr_trials, "high")
-    low_rewards = mean_advisor_rewards_after_random_selections(landscapes, nr_trials, "low")
+def landscape_trio_json(trio):
     trio_json = []
     for landscape in trio:
         trio_json.append({"coefficients_low": list(landscape.get_coefficients_low()),
                           "coefficients_high": list(landscape.get_coefficients_high()),
                           "block_nr1": landscape.get_block_nr1(),
                           "block_nr2": landscape.get_block_nr2()})
-    results_json.append({"trio": trio_json,
-                         "high_rewards": list(high_rewards),
-                         "low_rewards": list(low_rewards)})
+    return trio_json
+
+
+def simulate_trio(trio):
+    (high_statistics, low_statistics), nr_repeats = advisor_reward_statistics_with_repeats(
+        trio, nr_trials, ["high", "low"], repeat_landscape, exact_expectation, paired_simulation,
+        target_half_width, batch_nr_repeats)
+    return {"trio": landscape_trio_json(trio),
+            "high_rewards": high_statistics.get_means().tolist(),
+            "low_rewards": low_statistics.get_means().tolist(),
+            "high_rewards_standard_errors": high_statistics.standard_errors().tolist(),
+            "low_rewards_standard_errors": low_statistics.standard_errors().tolist(),
+            "nr_repeats": nr_repeats}
+
+
+repeat_landscape = 300
+nr_trials = 20
+# evaluate the advisors by the exact expected value of their suggestions instead of sampling one suggestion
+exact_expectation = False
+# feed the global and local advisors the same random selections (common random numbers)
+paired_simulation = False
+# if not None, repeats are simulated in batches of batch_nr_repeats until the 95% confidence interval of every mean
+# AI value is at most target_half_width (in percentage points) wide on each side, with at most repeat_landscape repeats
+target_half_width = None
+batch_nr_repeats = 20
+
+seed = 0
+# number of worker processes (None for one per core)
+nr_processes = None
+# finished shards are saved here and skipped when the script is run again with the same configuration
+shards_directory = "outputs/advisor_high_low_comparison_preselected_landscapes/shards"
+
+if __name__ == "__main__":
+    trios = load_landscape_trios()
+    # the configuration read by simulate_trio, the shards are run again if it changes
+    settings = {"nr_trials": nr_trials, "repeat_landscape": repeat_landscape, "exact_expectation": exact_expectation,
+                "paired_simulation": paired_simulation, "target_half_width": target_half_width,
+                "batch_nr_repeats": batch_nr_repeats}
+    results_json = run_shards(simulate_trio, trios, seed, shards_directory, nr_processes, settings,
+                              [landscape_trio_json(trio) for trio in trios])
 
-with open(
-        "outputs/advisor_high_low_comparison_preselected_landscapes/"
-        "advisor_high_low_comparison_preselected_landscapes.json",
-        "w",
-        encoding="utf-8") as file:
-    json.dump(results_json, file, ensure_ascii=False, indent=4)
+    with open(
+            "outputs/advisor_high_low_comparison_preselected_landscapes/"
+            "advisor_high_low_comparison_preselected_landscapes.json",
+            "w",
+            encoding="utf-8") as file:
+        json.dump(results_json, file, ensure_ascii=False, indent=4)
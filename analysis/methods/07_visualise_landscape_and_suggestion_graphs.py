@@ -4,119 +4,95 @@ Connect the configurations that differ in exactly 2 features with an edge.
 Randomly chooses a global and a local suggestion and highlights them in the graph.
 Draws a graph with and without highlighting the suggestions.
 Outputs PDF/PNG figures and JSON metadata per landscape.
+The figures are rendered in a process pool, and landscapes whose inputs did not change since they were last rendered
+(see manifest_path) are skipped. The graph layouts only depend on the suggestion groups and the seed, and are cached
+in layouts_directory.
 """
 
+import os
 import networkx
 import plotly.graph_objects as go
-import PIL.Image as Image
-import io
 import numpy as np
 import json
-from copy import deepcopy
+import hashlib
+from multiprocessing import Pool
 from tqdm import tqdm
-from common import load_landscapes, all_high_level_suggestions, all_low_level_suggestions, high_level_combination
-
-
-def are_neighbours_global(combination1, combination2):
-    if tuple(high_level_combination(combination1)) != tuple(high_level_combination(combination2)):
-        return False
-    edit_distance = 0
-    for i in range(len(combination1)):
-        if combination1[i] != combination2[i]:
-            edit_distance += 1
-    if edit_distance == 2:
-        return True
-    return False
-
-
-def are_neighbours_local(combination1, combination2):
-    edit_distance = 0
-    for i in range(len(combination1)):
-        if combination1[i] != combination2[i]:
-            edit_distance += 1
-    if edit_distance == 1:
-        return True
-    return False
-
-
-def are_neighbours(combination1, combination2):
-    return are_neighbours_local(combination1, combination2) or are_neighbours_global(combination1, combination2)
-
-
-def make_landscape_graph(combinations, rewards, suggestion_groups, graph_id):
-    node_indices = []
-    node_marker_symbols = []
-    node_marker_colours = []
-    node_marker_sizes = []
-    special_node_indices = []
-    for i in range(len(combinations)):
-        node_indices.append(i)
-        is_in_group = False
-        for suggestion_group in suggestion_groups:
-            if suggestion_group["suggestion"].is_matching_combination(combinations[i]):
-                node_marker_symbols.append(suggestion_group["symbol"])
-                node_marker_colours.append(rewards[i])
-                node_marker_sizes.append(25)
-                special_node_indices.append(i)
-                is_in_group = True
-                break
-        if not is_in_group:
-            node_marker_symbols.append("circle")
-            node_marker_colours.append("rgb(153, 153, 153)")
-            node_marker_sizes.append(15)
-
+from common import (load_landscapes, all_high_level_suggestions, all_low_level_suggestions, neighbour_edges,
+                    suggestion_group_masks, first_suggestion_groups, edge_group_memberships, suggestion_group_signature)
+
+
+def landscape_edge_weights(group_masks):
+    # edges within a group attract their ends, edges between different groups repel them
+    is_within_group, is_between_groups = edge_group_memberships(group_masks)
+    return np.where(is_within_group, 5, np.where(is_between_groups, -0.2, 3))
+
+
+def load_layout(layout_path):
+    # returns the suggestion group masks and node positions of a cached layout
+    with open(layout_path, "r", encoding="utf-8") as file:
+        layout_json = json.load(file)
+    group_masks = np.zeros((len(layout_json["suggestion_groups"]), 256), dtype=bool)
+    for group_nr, codes in enumerate(layout_json["suggestion_groups"]):
+        group_masks[group_nr, codes] = True
+    return group_masks, np.array(layout_json["positions"])
+
+
+def most_similar_cached_layout(group_masks, seed):
+    # positions of the cached layout with the fewest edges of a different weight, None if there is none
+    edge_weights = landscape_edge_weights(group_masks)
+    min_nr_differences = None
+    initial_positions = None
+    for file_name in sorted(os.listdir(layouts_directory)):
+        if not file_name.endswith(f"_{seed}.json"):
+            continue
+        cached_group_masks, positions = load_layout(f"{layouts_directory}/{file_name}")
+        nr_differences = np.count_nonzero(landscape_edge_weights(cached_group_masks) != edge_weights)
+        if min_nr_differences is None or nr_differences < min_nr_differences:
+            min_nr_differences = nr_differences
+            initial_positions = {node: position for node, position in enumerate(positions)}
+    return initial_positions
+
+
+def landscape_graph_layout(group_masks, seed):
+    # node positions, shape (256, 2)
+    layout_path = f"{layouts_directory}/{suggestion_group_signature(group_masks)}_{seed}.json"
+    if os.path.exists(layout_path):
+        return load_layout(layout_path)[1]
     landscape_graph = networkx.Graph()
-    landscape_graph.add_nodes_from(node_indices)
-    for i in range(len(combinations)):
-        for j in range(i + 1, len(combinations)):
-            if are_neighbours(combinations[i], combinations[j]):
-                landscape_graph.add_edge(i, j)
-                are_same_suggestion_group = False
-                in_suggestion_group_1 = False
-                in_suggestion_group_2 = False
-                for suggestion_group in suggestion_groups:
-                    if suggestion_group["suggestion"].is_matching_combination(combinations[i]):
-                        in_suggestion_group_1 = True
-                    if suggestion_group["suggestion"].is_matching_combination(combinations[j]):
-                        in_suggestion_group_2 = True
-                    if suggestion_group["suggestion"].is_matching_combination(combinations[i]) and \
-                            suggestion_group["suggestion"].is_matching_combination(combinations[j]):
-                        landscape_graph.add_weighted_edges_from([(i, j, 5)])
-                        are_same_suggestion_group = True
-                        break
-                if not are_same_suggestion_group:
-                    if in_suggestion_group_1 and in_suggestion_group_2:
-                        landscape_graph.add_weighted_edges_from([(i, j, -0.2)])
-                    else:
-                        landscape_graph.add_weighted_edges_from([(i, j, 3)])
-    pos = networkx.spring_layout(landscape_graph, k=1 / 10)
-    edge_x_within_groups = []
-    edge_y_within_groups = []
-    edge_x_without_groups = []
-    edge_y_without_groups = []
-
-    for edge in landscape_graph.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        is_edge_within_groups = False
-        for suggestion_group in suggestion_groups:
-            if suggestion_group["suggestion"].is_matching_combination(combinations[edge[0]]) and \
-                    suggestion_group["suggestion"].is_matching_combination(combinations[edge[1]]):
-                edge_x_within_groups.append(x0)
-                edge_x_within_groups.append(x1)
-                edge_x_within_groups.append(None)
-                edge_y_within_groups.append(y0)
-                edge_y_within_groups.append(y1)
-                edge_y_within_groups.append(None)
-                is_edge_within_groups = True
-                break
-        if not is_edge_within_groups:
-            edge_x_without_groups.append(x0)
-            edge_x_without_groups.append(x1)
-            edge_x_without_groups.append(None)
-            edge_y_without_groups.append(y0)
-            edge_y_without_groups.append(y1)
-            edge_y_without_groups.append(None)
+    landscape_graph.add_nodes_from(range(group_masks.shape[1]))
+    landscape_graph.add_weighted_edges_from(zip(neighbour_edges[:, 0].tolist(), neighbour_edges[:, 1].tolist(),
+                                                landscape_edge_weights(group_masks).tolist()))
+    initial_positions = most_similar_cached_layout(group_masks, seed) if warm_start_layouts else None
+    pos = networkx.spring_layout(landscape_graph, k=1 / 10, pos=initial_positions, seed=seed)
+    positions = np.array([pos[node] for node in range(group_masks.shape[1])])
+    layout_json = {"suggestion_groups": [np.flatnonzero(mask).tolist() for mask in group_masks],
+                   "positions": positions.tolist()}
+    # write to a temporary file first, other worker processes may read the cached layouts at the same time
+    with open(layout_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(layout_json, file)
+    os.replace(layout_path + ".tmp", layout_path)
+    return positions
+
+
+def make_landscape_graph(combinations, rewards, suggestion_groups, graph_id, layout_seed):
+    # the combinations are indexed by their code, so the nodes and edges of the topology can be used directly
+    group_masks = suggestion_group_masks([suggestion_group["suggestion"] for suggestion_group in suggestion_groups])
+    node_groups = first_suggestion_groups(group_masks)
+    special_node_indices = np.flatnonzero(node_groups >= 0).tolist()
+    node_marker_symbols = [suggestion_groups[group]["symbol"] if group >= 0 else "circle" for group in node_groups]
+
+    is_within_group, _ = edge_group_memberships(group_masks)
+    node_positions = landscape_graph_layout(group_masks, layout_seed)
+
+    # line segments of the edges, separated by None
+    edge_x = np.full((len(neighbour_edges), 3), None)
+    edge_y = np.full((len(neighbour_edges), 3), None)
+    edge_x[:, :2] = node_positions[neighbour_edges, 0]
+    edge_y[:, :2] = node_positions[neighbour_edges, 1]
+    edge_x_within_groups = edge_x[is_within_group].ravel().tolist()
+    edge_y_within_groups = edge_y[is_within_group].ravel().tolist()
+    edge_x_without_groups = edge_x[~is_within_group].ravel().tolist()
+    edge_y_without_groups = edge_y[~is_within_group].ravel().tolist()
 
     edge_trace_within_groups = go.Scatter(
         x=edge_x_within_groups, y=edge_y_within_groups,
@@ -139,18 +115,11 @@ def make_landscape_graph(combinations, rewards, suggestion_groups, graph_id):
         mode='lines',
     )
 
-    node_x = []
-    node_y = []
-    node_x_special = []
-    node_y_special = []
-    for node in landscape_graph.nodes():
-        x, y = pos[node]
-        if node in special_node_indices:
-            node_x_special.append(x)
-            node_y_special.append(y)
-        else:
-            node_x.append(x)
-            node_y.append(y)
+    is_special_node = node_groups >= 0
+    node_x = node_positions[~is_special_node, 0].tolist()
+    node_y = node_positions[~is_special_node, 1].tolist()
+    node_x_special = node_positions[is_special_node, 0].tolist()
+    node_y_special = node_positions[is_special_node, 1].tolist()
 
     tickmax, tickmin = 150, 50
 
@@ -254,12 +223,10 @@ def make_landscape_graph(combinations, rewards, suggestion_groups, graph_id):
             color="black"
         )
     )
-    fig_with_suggestions.write_image(f"figures/landscape_and_suggestion_graphs/{graph_id}.pdf")
-    img_bytes = fig_with_suggestions.to_image(format="png")
-    img = Image.open(io.BytesIO(img_bytes))
-    img.save(f"figures/landscape_and_suggestion_graphs/{graph_id}.png")
+    fig_with_suggestions.write_image(f"{figures_directory}/{graph_id}.pdf")
+    fig_with_suggestions.write_image(f"{figures_directory}/{graph_id}.png")
 
-    combined_rewards = [rewards[node] for node in landscape_graph.nodes() if node not in special_node_indices] + \
+    combined_rewards = [rewards[node] for node in np.flatnonzero(~is_special_node)] + \
                        [rewards[node] for node in special_node_indices]
     node_trace = go.Scatter(
         x=node_x + node_x_special, y=node_y + node_y_special,
@@ -317,14 +284,59 @@ def make_landscape_graph(combinations, rewards, suggestion_groups, graph_id):
             color="black"
         )
     )
-    fig.write_image(f"figures/landscape_and_suggestion_graphs/{graph_id}_without_suggestions.pdf")
-    img_bytes = fig.to_image(format="png")
-    img = Image.open(io.BytesIO(img_bytes))
-    img.save(f"figures/landscape_and_suggestion_graphs/{graph_id}_without_suggestions.png")
+    fig.write_image(f"{figures_directory}/{graph_id}_without_suggestions.pdf")
+    fig.write_image(f"{figures_directory}/{graph_id}_without_suggestions.png")
+
+
+def landscape_figure_paths(graph_id):
+    return [f"{figures_directory}/{graph_id}{suffix}.{extension}"
+            for suffix in ["", "_without_suggestions"] for extension in ["pdf", "png"]]
+
+
+def render_landscape_graph(arguments):
+    # runs in a worker process, which keeps its kaleido process for all landscapes it renders
+    combinations, rewards, suggestion_groups, graph_id, input_hash = arguments
+    make_landscape_graph(combinations, rewards, suggestion_groups, graph_id, layout_seed)
+    return graph_id, input_hash
+
+
+def landscape_input_hash(landscape, suggestion_groups):
+    # hash of everything a landscape graph depends on
+    inputs = {"coefficients_low": list(landscape.get_coefficients_low()),
+              "coefficients_high": list(landscape.get_coefficients_high()),
+              "block_nr1": landscape.get_block_nr1(),
+              "block_nr2": landscape.get_block_nr2(),
+              "min_reward": min_reward,
+              "suggestion_groups": [[str(suggestion_group["suggestion"]), suggestion_group["symbol"]]
+                                    for suggestion_group in suggestion_groups],
+              "layout_seed": layout_seed}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_manifest(manifest):
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def save_rendered_graphs(rendered_graphs, nr_graphs, manifest):
+    # the manifest is saved after every rendered landscape, so that an interrupted run continues where it stopped
+    for graph_id, input_hash in tqdm(rendered_graphs, total=nr_graphs):
+        manifest[str(graph_id)] = input_hash
+        save_manifest(manifest)
 
 
 def save_suggestion_group_symbols(symbols):
     for symbol in symbols:
+        if os.path.exists(f"{figures_directory}/{symbol}.pdf") and os.path.exists(f"{figures_directory}/{symbol}.png"):
+            continue
         node_trace = go.Scatter(
             x=[1], y=[1],
             mode='markers',
@@ -350,23 +362,15 @@ def save_suggestion_group_symbols(symbols):
                         ),
                         )
 
-        fig.write_image(f"figures/landscape_and_suggestion_graphs/{symbol}.pdf")
-        img_bytes = fig.to_image(format="png")
-        img = Image.open(io.BytesIO(img_bytes))
-        img.save(f"figures/landscape_and_suggestion_graphs/{symbol}.png")
+        fig.write_image(f"{figures_directory}/{symbol}.pdf")
+        fig.write_image(f"{figures_directory}/{symbol}.png")
 
 
 def are_clashing_groups(group1, group2):
-    for combination1 in group1.all_matching_combinations():
-        for combination2 in group2.all_matching_combinations():
-            if tuple(combination1) == tuple(combination2):
-                return True
-    return False
+    return bool(np.any(group1.matching_combination_mask() & group2.matching_combination_mask()))
 
 
 def choose_suggestion_groups(landscape):
-    marker_symbols = ["triangle-down", "triangle-up", "diamond", "cross", "star-triangle-up", "x", "star", "square"]
-    save_suggestion_group_symbols(marker_symbols)
     high_level_groups = all_high_level_suggestions()
     low_level_groups = all_low_level_suggestions(landscape.get_block_nr1(), landscape.get_block_nr2())
     # choose the local group that has the average AI reward closest to 0
@@ -392,39 +396,68 @@ def choose_suggestion_groups(landscape):
         groups_with_symbols.append({"suggestion": groups[i], "symbol": marker_symbols[i]})
     return groups_with_symbols
 
-landscapes = load_landscapes("landscapes/landscape_trios_20.json")
-combinations = landscapes[0].get_combinations()
-for landscape in tqdm(landscapes):
-    landscape.init_scaled_rewards_with_min_reward(30)
-    rewards = []
-    for combination in combinations:
-        selection = landscape.selection_with_non_noisy_reward(combination)
-        rewards.append(selection.get_reward())
-    suggestion_groups = choose_suggestion_groups(landscape)
-    make_landscape_graph(combinations, rewards, deepcopy(suggestion_groups), landscape.get_id())
-    # save suggestion_groups in json
-    suggestion_groups_dict = []
-    for suggestion_group in suggestion_groups:
-        suggestion_groups_dict.append({
-            "suggestion": str(suggestion_group["suggestion"]),
-            "symbol": suggestion_group["symbol"],
-        })
-    combinations_and_rewards = []
-    for i in range(len(combinations)):
-        combinations_and_rewards.append({
-            "combination": str(tuple(combinations[i])),
-            "reward": rewards[i]
-        })
-    landscape_json = {
-        "suggestion_groups": suggestion_groups_dict,
-        "landscape": {
-            "id": landscape.get_id(),
-            "block_nr1": landscape.get_block_nr1(),
-            "block_nr2": landscape.get_block_nr2(),
-            "coefficients_low": landscape.get_coefficients_low(),
-            "coefficients_high": landscape.get_coefficients_high(),
-            "combinations": combinations_and_rewards,
-        },
-    }
-    with open(f"figures/landscape_and_suggestion_graphs/{landscape.get_id()}_suggestion_groups.json", "w") as file:
-        json.dump(landscape_json, file, indent=4)
+
+figures_directory = "figures/landscape_and_suggestion_graphs"
+marker_symbols = ["triangle-down", "triangle-up", "diamond", "cross", "star-triangle-up", "x", "star", "square"]
+min_reward = 30
+layout_seed = 0
+# number of worker processes (None for one per core)
+nr_processes = None
+# input hashes of the rendered landscapes
+manifest_path = f"{figures_directory}/manifest.json"
+# cached graph layouts, keyed by the suggestion groups and the seed
+layouts_directory = f"{figures_directory}/layouts"
+# start new layouts from the most similar cached layout, which is faster but makes them depend on the cache
+warm_start_layouts = False
+
+if __name__ == "__main__":
+    os.makedirs(layouts_directory, exist_ok=True)
+    save_suggestion_group_symbols(marker_symbols)
+    landscapes = load_landscapes("landscapes/landscape_trios_20.json")
+    combinations = landscapes[0].get_combinations()
+    manifest = load_manifest()
+    render_arguments = []
+    for landscape in tqdm(landscapes):
+        landscape.init_scaled_rewards_with_min_reward(min_reward)
+        rewards = []
+        for combination in combinations:
+            selection = landscape.selection_with_non_noisy_reward(combination)
+            rewards.append(selection.get_reward())
+        suggestion_groups = choose_suggestion_groups(landscape)
+        input_hash = landscape_input_hash(landscape, suggestion_groups)
+        if manifest.get(str(landscape.get_id())) != input_hash or \
+                not all(os.path.exists(path) for path in landscape_figure_paths(landscape.get_id())):
+            render_arguments.append((combinations, rewards, suggestion_groups, landscape.get_id(), input_hash))
+        # save suggestion_groups in json
+        suggestion_groups_dict = []
+        for suggestion_group in suggestion_groups:
+            suggestion_groups_dict.append({
+                "suggestion": str(suggestion_group["suggestion"]),
+                "symbol": suggestion_group["symbol"],
+            })
+        combinations_and_rewards = []
+        for i in range(len(combinations)):
+            combinations_and_rewards.append({
+                "combination": str(tuple(combinations[i])),
+                "reward": rewards[i]
+            })
+        landscape_json = {
+            "suggestion_groups": suggestion_groups_dict,
+            "landscape": {
+                "id": landscape.get_id(),
+                "block_nr1": landscape.get_block_nr1(),
+                "block_nr2": landscape.get_block_nr2(),
+                "coefficients_low": landscape.get_coefficients_low(),
+                "coefficients_high": landscape.get_coefficients_high(),
+                "combinations": combinations_and_rewards,
+            },
+        }
+        with open(f"{figures_directory}/{landscape.get_id()}_suggestion_groups.json", "w") as file:
+            json.dump(landscape_json, file, indent=4)
+
+    if nr_processes == 1:
+        save_rendered_graphs(map(render_landscape_graph, render_arguments), len(render_arguments), manifest)
+    else:
+        with Pool(nr_processes) as pool:
+            save_rendered_graphs(pool.imap_unordered(render_landscape_graph, render_arguments), len(render_arguments),
+                                 manifest)
@@ -0,0 +1,75 @@
+"""
+Benchmarks the cost of updating an advisor with a selection and of sampling a combination as the number of features
+grows. Runs the block model for several numbers of blocks and block sizes, and the 8-feature Advisor (by enumeration
+and block-wise) as reference. Prints the mean times (in microseconds), which depend on the machine and are therefore
+not saved.
+"""
+
+from common import Advisor, BlockModel, BlockAdvisor, generate_random_block_landscapes, generate_random_landscapes
+from time import perf_counter
+from tqdm import tqdm
+
+
+def mean_times_block_model(nr_blocks, block_size, nr_trials, nr_repeats):
+    # mean time of one update_with_selection and of one sample_combination of a BlockAdvisor
+    model = BlockModel(nr_blocks, block_size)
+    update_time = 0.0
+    sample_time = 0.0
+    for landscape in generate_random_block_landscapes(model, nr_repeats):
+        landscape.init_scaled_rewards()
+        advisor = BlockAdvisor(model, landscape.get_block_nr1(), landscape.get_block_nr2())
+        for trial in range(nr_trials):
+            start_time = perf_counter()
+            setting_indices = advisor.sample_combination()
+            sample_time += perf_counter() - start_time
+            reward = landscape.noisy_rewards(setting_indices)[0]
+            start_time = perf_counter()
+            advisor.update_with_selection(setting_indices, reward)
+            update_time += perf_counter() - start_time
+    return update_time / (nr_trials * nr_repeats) * 1000000, sample_time / (nr_trials * nr_repeats) * 1000000
+
+
+def mean_times_advisor(factorized, nr_trials, nr_repeats):
+    # same as mean_times_block_model for the 8-feature Advisor
+    update_time = 0.0
+    sample_time = 0.0
+    for landscape in generate_random_landscapes(nr_repeats):
+        landscape.init_scaled_rewards()
+        advisor = Advisor(landscape.get_block_nr1(), landscape.get_block_nr2(), incremental=True,
+                          factorized=factorized)
+        for trial in range(nr_trials):
+            start_time = perf_counter()
+            combination = advisor.sample_combination(landscape.get_combinations())
+            sample_time += perf_counter() - start_time
+            selection = landscape.selection_with_noisy_reward(combination)
+            start_time = perf_counter()
+            advisor.update_with_selection(selection)
+            update_time += perf_counter() - start_time
+    return update_time / (nr_trials * nr_repeats) * 1000000, sample_time / (nr_trials * nr_repeats) * 1000000
+
+
+# (nr_blocks, block_size) of the benchmarked models
+model_sizes = [(4, 2), (6, 2), (8, 2), (12, 2), (4, 3), (8, 3), (6, 4)]
+nr_trials = 20
+nr_repeats = 50
+
+if __name__ == "__main__":
+    results = []
+    for factorized in [False, True]:
+        update_time, sample_time = mean_times_advisor(factorized, nr_trials, nr_repeats)
+        results.append({"model": "Advisor (block-wise)" if factorized else "Advisor (enumeration)",
+                        "nr_features": 8,
+                        "block_size": 2,
+                        "update_time": update_time,
+                        "sample_time": sample_time})
+    for nr_blocks, block_size in tqdm(model_sizes):
+        update_time, sample_time = mean_times_block_model(nr_blocks, block_size, nr_trials, nr_repeats)
+        results.append({"model": "BlockAdvisor",
+                        "nr_features": nr_blocks * block_size,
+                        "block_size": block_size,
+                        "update_time": update_time,
+                        "sample_time": sample_time})
+
+    for result in results:
+        print(f"{result['model']:>22}  features: {result['nr_features']:>2}  block size: {result['block_size']}  "
+              f"update: {result['update_time']:>8.1f} us  sample: {result['sample_time']:>8.1f} us")
@@ -12,9 +12,8 @@ Validates the saved experimental data. Checks the following:
 """
 
 import json
-from itertools import product
 import datetime
-from common import Landscape, Advisor, Selection, HighLevelSuggestion, LowLevelSuggestion
+from common import Landscape, Advisor, Selection, HighLevelSuggestion, LowLevelSuggestion, indexed_combinations
 from tqdm import tqdm
 
 data_path = "data/ColourCombo_101_flagged.json"
@@ -104,14 +103,15 @@ def check_number_rounds(participant_data):
 
 def check_correct_ai_suggestions(participant_data):
     advice_type = participant_data["recommendationType"]
-    all_combinations = list(product([-1, 1], repeat=8))
+    all_combinations = indexed_combinations
     # the saved suggestion often has to be among the best suggestions
     total_suggestions = 0
     matching_suggestions = 0
     for round_data in participant_data["roundsData"]:
         if round_data["roundType"] == "assisted":
             landscape_data = round_data["landscape"]
-            advisor = Advisor(landscape_data["blockNr1"], landscape_data["blockNr2"])
+            # enumerate all combinations (with exact ties among the best ones) as the experiment does
+            advisor = Advisor(landscape_data["blockNr1"], landscape_data["blockNr2"], factorized=False)
             for trial_data in round_data["trials"]:
                 total_suggestions += 1
                 combination = trial_data["combination"]